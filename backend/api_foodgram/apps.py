@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ApiFoodgramConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api_foodgram'
+
+    def ready(self):
+        from api_foodgram import signals  # noqa: F401
@@ -1,13 +1,208 @@
 import base64
+import binascii
+from tempfile import SpooledTemporaryFile
 
-from django.core.files.base import ContentFile
+from django.core.files import File
+from PIL import Image
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+from backend.constants import MAX_IMAGE_PIXELS, MAX_IMAGE_SIZE
+from recipes.images import get_image_names, storage
+
+IMAGE_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+)
+# Кратно 4, чтобы каждая часть base64 декодировалась отдельно.
+BASE64_CHUNK_SIZE = 64 * 1024
+SPOOL_SIZE = 1024 * 1024
+
+
+def get_image_format(header):
+    """Формат изображения по сигнатуре первых байтов файла."""
+    for signature, image_format in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return image_format
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
 
 
 class Base64ImageField(serializers.ImageField):
+    """
+    Изображение в виде data URI с base64 или файла multipart/form-data.
+
+    base64 декодируется частями во временный файл, который держится
+    в памяти только до SPOOL_SIZE. Размер проверяется по длине строки
+    до декодирования, тип - по сигнатуре первых байтов, количество
+    пикселей - по заголовку до чтения всего изображения.
+    """
+
+    default_error_messages = {
+        'invalid_image': (
+            'Загрузите корректное изображение в формате '
+            'JPEG, PNG, GIF или WebP'
+        ),
+        'max_size': 'Размер изображения не должен превышать {max_size} МБ',
+        'max_pixels': (
+            'Изображение не должно содержать больше {max_pixels} пикселей'
+        ),
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-        return super().to_internal_value(data)
+            data = self.decode(data)
+        # Изображение проверяется в validate_image, проверка
+        # serializers.ImageField прочитала бы файл в память целиком.
+        file = super(serializers.ImageField, self).to_internal_value(data)
+        self.validate_image(file)
+        return file
+
+    def fail_max_size(self):
+        self.fail('max_size', max_size=MAX_IMAGE_SIZE // (1024 * 1024))
+
+    def decode(self, data):
+        # Строка не копируется: части base64 берутся срезами из data.
+        separator = data.find(';base64,')
+        offset = separator + len(';base64,')
+        if separator == -1 or offset == len(data):
+            self.fail('invalid_image')
+        # base64 может быть разбит на строки (base64.encodebytes).
+        length = len(data) - offset - sum(
+            data.count(character, offset) for character in '\r\n '
+        )
+        if length // 4 * 3 > MAX_IMAGE_SIZE:
+            self.fail_max_size()
+        file = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        try:
+            image_format = None
+            # Без пробельных символов часть может стать не кратной 4,
+            # остаток переносится в следующую.
+            remainder = ''
+            for start in range(offset, len(data), BASE64_CHUNK_SIZE):
+                chunk = remainder + ''.join(
+                    data[start:start + BASE64_CHUNK_SIZE].split()
+                )
+                end = len(chunk) // 4 * 4
+                chunk, remainder = chunk[:end], chunk[end:]
+                if not chunk:
+                    continue
+                chunk = base64.b64decode(chunk, validate=True)
+                if image_format is None:
+                    image_format = get_image_format(chunk)
+                    if image_format is None:
+                        self.fail('invalid_image')
+                file.write(chunk)
+            if remainder or image_format is None:
+                self.fail('invalid_image')
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_image')
+        except serializers.ValidationError:
+            file.close()
+            raise
+        size = file.tell()
+        file.seek(0)
+        image = File(file, name=f'temp.{IMAGE_FORMATS[image_format]}')
+        image.size = size
+        return image
+
+    def validate_image(self, file):
+        if file.size > MAX_IMAGE_SIZE:
+            self.fail_max_size()
+        try:
+            image = Image.open(file)
+            if image.format not in IMAGE_FORMATS:
+                self.fail('invalid_image')
+            width, height = image.size
+            if width * height > MAX_IMAGE_PIXELS:
+                self.fail('max_pixels', max_pixels=MAX_IMAGE_PIXELS)
+            image.verify()
+        except Image.DecompressionBombError:
+            self.fail('max_pixels', max_pixels=MAX_IMAGE_PIXELS)
+        except (OSError, SyntaxError, ValueError):
+            self.fail('invalid_image')
+        finally:
+            file.seek(0)
+
+
+class ImageDerivativesField(serializers.Field):
+    """Ссылки на уменьшенные копии изображения рецепта по размерам."""
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        names = get_image_names(recipe)
+        if names is None:
+            return None
+        request = self.context.get('request')
+        urls = {}
+        for variant, name in names.items():
+            url = storage.url(name)
+            urls[variant] = (
+                request.build_absolute_uri(url) if request else url
+            )
+        return urls
+
+
+def get_objects_by_ids(queryset, ids, message):
+    """
+    Объекты queryset в порядке ids, загруженные одним запросом IN.
+    Если части id нет в базе, ошибка перечисляет их все.
+    """
+    objects = queryset.in_bulk(set(ids))
+    missing = [pk for pk in dict.fromkeys(ids) if pk not in objects]
+    if missing:
+        raise serializers.ValidationError(
+            message.format(pk_values=', '.join(map(str, missing)))
+        )
+    return [objects[pk] for pk in ids]
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    default_error_messages = {
+        'does_not_exist_many': 'Не найдены объекты с id: {pk_values}',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        ids = []
+        for pk in data:
+            try:
+                if isinstance(pk, bool):
+                    raise TypeError
+                ids.append(int(pk))
+            except (TypeError, ValueError):
+                self.child_relation.fail(
+                    'incorrect_type', data_type=type(pk).__name__
+                )
+        return get_objects_by_ids(
+            self.child_relation.get_queryset(),
+            ids,
+            self.error_messages['does_not_exist_many']
+        )
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Первичные ключи, которые при many=True проверяются одним запросом
+    вместо запроса на каждый id.
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
@@ -1,6 +1,21 @@
+from django import forms
 from django_filters import rest_framework as filter
 
 from recipes.models import Recipe, Tag
+from recipes.popularity import POPULAR_ORDERING
+from recipes.search import search_recipes
+
+
+class RecipeFilterForm(forms.Form):
+    def clean(self):
+        data = super().clean()
+        # Поиск сортирует по релевантности, ordering - по популярности,
+        # а курсор знает только второй порядок.
+        if data.get('search') and data.get('ordering'):
+            raise forms.ValidationError(
+                'Параметры search и ordering нельзя использовать вместе'
+            )
+        return data
 
 
 class RecipeFilter(filter.FilterSet):
@@ -15,14 +30,24 @@ class RecipeFilter(filter.FilterSet):
         to_field_name='slug',
         queryset=Tag.objects.all()
     )
+    search = filter.CharFilter(
+        method='filter_search'
+    )
+    ordering = filter.ChoiceFilter(
+        choices=(('popular', 'По количеству добавлений в избранное'), ),
+        method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
+        form = RecipeFilterForm
         fields = (
             'is_favorited',
             'is_in_shopping_cart',
             'author',
-            'tags'
+            'tags',
+            'search',
+            'ordering'
         )
 
     def filter_is_favorited(self, queryset, name, value):
@@ -34,3 +59,9 @@ class RecipeFilter(filter.FilterSet):
         if value:
             return queryset.filter(shopping_recipes__user=self.request.user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*POPULAR_ORDERING)
@@ -0,0 +1,154 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+
+from django.db import connection
+
+from api_foodgram.versions import get_versions
+from ingredients.models import Ingredient
+
+SIMILARITY_THRESHOLD = 0.3
+
+
+def normalize(value):
+    return value.casefold().replace('ё', 'е').strip()
+
+
+def get_trigrams(value):
+    """Триграммы строки по правилам pg_trgm: слова дополняются пробелами."""
+    trigrams = set()
+    for word in re.findall(r'\w+', normalize(value)):
+        word = f'  {word} '
+        trigrams.update(
+            word[index:index + 3] for index in range(len(word) - 2)
+        )
+    return trigrams
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для поиска по началу названия.
+
+    Названия хранятся в нормализованном виде в отсортированном списке,
+    поиск префикса - бинарный поиск и проход по соседним элементам.
+    Для нечеткого поиска хранится инвертированный индекс триграмм.
+    Индекс перестраивается, когда меняется версия 'ingredients' в БД,
+    в том числе после load_ingredients в другом процессе. Версия
+    проверяется при каждом обращении, с request - тем же запросом,
+    что и для ETag.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.ingredients = []
+        self.index = ([], [])
+        self.trigrams = ({}, {})
+        self.lock = Lock()
+
+    def refresh(self, request=None):
+        version = get_versions(
+            'ingredients', request=request
+        )['ingredients']
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            ingredients = [
+                {
+                    'id': ingredient_id,
+                    'name': name,
+                    'measurement_unit': measurement_unit,
+                }
+                for ingredient_id, name, measurement_unit
+                in Ingredient.objects.order_by('id').values_list(
+                    'id', 'name', 'measurement_unit'
+                )
+            ]
+            entries = sorted(
+                (normalize(ingredient['name']), ingredient['id'], ingredient)
+                for ingredient in ingredients
+            )
+            postings = defaultdict(list)
+            sizes = {}
+            for ingredient in ingredients:
+                trigrams = get_trigrams(ingredient['name'])
+                sizes[ingredient['id']] = len(trigrams)
+                for trigram in trigrams:
+                    postings[trigram].append(ingredient)
+            self.ingredients = ingredients
+            self.index = ([key for key, _, _ in entries], entries)
+            self.trigrams = (dict(postings), sizes)
+            self.version = version
+
+    def all(self, request=None):
+        self.refresh(request)
+        return self.ingredients
+
+    def search(self, prefix, limit=None, request=None):
+        """
+        Ингредиенты, название которых начинается с prefix без учета
+        регистра: сначала точное совпадение, затем более короткие названия.
+        """
+        self.refresh(request)
+        prefix = normalize(prefix)
+        keys, entries = self.index
+        start = bisect_left(keys, prefix)
+        end = start
+        while end < len(keys) and keys[end].startswith(prefix):
+            end += 1
+        matches = sorted(
+            entries[start:end],
+            key=lambda entry: (entry[0] != prefix, len(entry[0]), entry[0])
+        )
+        return [ingredient for _, _, ingredient in matches[:limit]]
+
+    def similar(self, name, limit=None, threshold=SIMILARITY_THRESHOLD,
+                request=None):
+        """
+        Ингредиенты, похожие на name по доле общих триграмм (как similarity
+        в pg_trgm), в порядке убывания сходства.
+        """
+        self.refresh(request)
+        postings, sizes = self.trigrams
+        query = get_trigrams(name)
+        shared = defaultdict(int)
+        ingredients = {}
+        for trigram in query:
+            for ingredient in postings.get(trigram, ()):
+                shared[ingredient['id']] += 1
+                ingredients[ingredient['id']] = ingredient
+        matches = []
+        for ingredient_id, count in shared.items():
+            similarity = count / (
+                len(query) + sizes[ingredient_id] - count
+            )
+            if similarity >= threshold:
+                ingredient = ingredients[ingredient_id]
+                matches.append(
+                    (-similarity, len(ingredient['name']), ingredient_id)
+                )
+        matches.sort()
+        return [
+            ingredients[ingredient_id]
+            for _, _, ingredient_id in matches[:limit]
+        ]
+
+
+ingredient_index = IngredientIndex()
+
+
+def search_similar(name, limit, request=None):
+    if connection.vendor != 'postgresql':
+        return ingredient_index.similar(name, limit, request=request)
+    from django.contrib.postgres.search import TrigramSimilarity
+    return list(
+        Ingredient.objects.filter(
+            name__trigram_similar=name
+        ).annotate(
+            similarity=TrigramSimilarity('name', name)
+        ).order_by(
+            '-similarity', 'name'
+        ).values('id', 'name', 'measurement_unit')[:limit]
+    )
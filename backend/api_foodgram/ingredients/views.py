@@ -1,11 +1,35 @@
-from rest_framework import filters, viewsets
+from rest_framework import viewsets
+from rest_framework.response import Response
 
+from api_foodgram.ingredients.search import ingredient_index, search_similar
 from api_foodgram.ingredients.serializers import IngredientsSerializer
+from api_foodgram.mixins import ConditionalGetMixin
 from ingredients.models import Ingredient
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientsSerializer
-    filter_backends = (filters.SearchFilter, )
-    search_fields = ('^name', )
+    version_names = ('ingredients', )
+    search_param = 'name'
+    limit_param = 'limit'
+    fuzzy_param = 'fuzzy'
+    search_limit = 50
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(self.search, request)
+
+    def search(self, request):
+        name = request.query_params.get(self.search_param)
+        if not name:
+            return Response(ingredient_index.all(request))
+        try:
+            limit = int(request.query_params[self.limit_param])
+        except (KeyError, ValueError):
+            limit = self.search_limit
+        limit = max(limit, 1)
+        if request.query_params.get(self.fuzzy_param) in ('1', 'true'):
+            return Response(search_similar(name, limit, request))
+        return Response(
+            ingredient_index.search(name, limit, request=request)
+        )
@@ -1,6 +1,16 @@
+from hashlib import md5
+
 from django.db.models.query import prefetch_related_objects
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from rest_framework import status
 from rest_framework.response import Response
 
+from api_foodgram.relations import (add_relations, get_relations,
+                                    remove_relations)
+from api_foodgram.serializers import IdListSerializer
+from api_foodgram.versions import get_versions
+
 
 class UpdateModelMixin:
     """
@@ -27,3 +37,111 @@ class UpdateModelMixin:
 
     def perform_update(self, serializer):
         serializer.save()
+
+
+class ConditionalGetMixin:
+    """
+    Conditional GET для list и retrieve.
+
+    ETag строится из адреса запроса и версий из version_names, для ответов
+    с пользовательскими флагами (user_dependent) - еще и из версии связей
+    пользователя. Совпавший If-None-Match получает 304 без обращения
+    к сериализаторам.
+    """
+
+    version_names = ()
+    user_dependent = False
+
+    def get_version_names(self):
+        return self.version_names
+
+    def get_cache_version(self, request):
+        """
+        Версия данных ответа без учета адреса: по ней же кэшируется
+        количество записей в пагинаторе.
+        """
+        versions = get_versions(
+            *self.get_version_names(), request=request
+        )
+        parts = [versions[name] for name in sorted(versions)]
+        if self.user_dependent:
+            parts.append(str(request.user.id))
+            parts.append(get_relations(request).version)
+        return ':'.join(parts)
+
+    def get_etag(self, request):
+        parts = [
+            request.build_absolute_uri(),
+            request.accepted_renderer.format,
+            self.get_cache_version(request),
+        ]
+        return quote_etag(md5(':'.join(parts).encode()).hexdigest())
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_conditional_response(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if self.user_dependent:
+                patch_vary_headers(response, ('Authorization', 'Cookie'))
+        return response
+
+
+class BatchRelationMixin:
+    """
+    Добавление и удаление связей пользователя сразу с несколькими
+    объектами: id проверяются одним запросом IN, связи пишутся одним
+    INSERT или DELETE. Для каждого id возвращается статус, который
+    вернул бы соответствующий одиночный запрос.
+    """
+
+    def update_relations(self, request, model, field, targets, messages,
+                         forbidden=()):
+        serializer = IdListSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        found = set(
+            targets.filter(id__in=ids).values_list('id', flat=True)
+        )
+        allowed = [
+            target_id for target_id in ids
+            if target_id in found and target_id not in forbidden
+        ]
+        if request.method == 'POST':
+            changed = add_relations(model, request.user, field, allowed)
+            success, failure = status.HTTP_201_CREATED, messages['exists']
+        else:
+            changed = remove_relations(model, request.user, field, allowed)
+            success = status.HTTP_204_NO_CONTENT
+            failure = messages['missing']
+        results = []
+        for target_id in ids:
+            if target_id not in found:
+                result = {
+                    'status': status.HTTP_404_NOT_FOUND,
+                    'detail': messages['not_found'],
+                }
+            elif target_id in changed:
+                result = {'status': success}
+            else:
+                result = {
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'detail': (
+                        messages['forbidden'] if target_id in forbidden
+                        else failure
+                    ),
+                }
+            results.append({'id': target_id, **result})
+        return Response({'results': results})
@@ -0,0 +1,20 @@
+from django.db import models
+
+
+class Version(models.Model):
+    name = models.CharField(
+        'Имя',
+        max_length=64,
+        primary_key=True,
+    )
+    value = models.CharField(
+        'Версия',
+        max_length=32,
+    )
+
+    class Meta:
+        verbose_name = 'версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,14 @@
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class IgnoreFormatNegotiation(DefaultContentNegotiation):
+    """
+    Согласование без учета параметра ?format=.
+
+    Для представлений, где format выбирает формат файла, который
+    представление формирует само, а ответы DRF (ошибки, статусы)
+    отдаются первым рендерером.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
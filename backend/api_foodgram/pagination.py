@@ -1,6 +1,232 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date
+from functools import partial
+from hashlib import md5
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator, кэширующий COUNT(*) по тексту запроса и версии данных
+    на count_timeout секунд.
+
+    Версия (ConditionalGetMixin.get_cache_version) меняется вместе
+    с данными, от которых зависит выборка, в том числе со связями
+    пользователя для фильтров вроде is_favorited. Без версии COUNT
+    не кэшируется.
+    """
+
+    count_timeout = 60
+    version = None
+
+    def __init__(self, object_list, per_page, *args, version=None,
+                 **kwargs):
+        super().__init__(object_list, per_page, *args, **kwargs)
+        if version is not None:
+            self.version = version
+
+    @cached_property
+    def count(self):
+        if self.version is None or not isinstance(
+            self.object_list, QuerySet
+        ):
+            return super().count
+        try:
+            sql, params = self.object_list.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        key = 'paginator_count:' + md5(
+            f'{sql}{params}{self.version}'.encode()
+        ).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count, self.count_timeout)
+        return count
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная пагинация по набору полей сортировки без OFFSET и COUNT(*).
+
+    Курсор хранит значения полей сортировки последней (или первой, для
+    предыдущей страницы) записи, следующая страница выбирается условием
+    (f1, f2, ...) < (v1, v2, ...), которое обслуживается индексом.
+    """
+
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def __init__(self, ordering, page_size):
+        self.ordering = ordering
+        self.page_size = page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        values, self.reverse = self.decode_cursor(request, queryset.model)
+        ordering = self.ordering
+        if self.reverse:
+            ordering = tuple(self.invert(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            try:
+                queryset = queryset.filter(
+                    self.get_keyset_filter(ordering, values)
+                )
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+        has_next = has_more if not self.reverse else True
+        has_previous = has_more if self.reverse else values is not None
+        self.next_cursor = (
+            self.encode_cursor(results[-1], reverse=False)
+            if has_next and results else None
+        )
+        self.previous_cursor = (
+            self.encode_cursor(results[0], reverse=True)
+            if has_previous and results else None
+        )
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_link(self.next_cursor),
+            'previous': self.get_link(self.previous_cursor),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor
+        )
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    @staticmethod
+    def get_keyset_filter(ordering, values):
+        keyset = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition = Q(**{f'{name}__{lookup}': values[index]})
+            for previous, value in zip(ordering[:index], values):
+                condition &= Q(**{previous.lstrip('-'): value})
+            keyset |= condition
+        return keyset
+
+    def encode_cursor(self, instance, reverse):
+        values = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            if isinstance(value, date):
+                value = value.isoformat()
+            values.append(value)
+        return urlsafe_b64encode(
+            json.dumps({'v': values, 'r': reverse}).encode()
+        ).decode()
+
+    @staticmethod
+    def get_ordering_field(model, field):
+        name = field.lstrip('-')
+        return model._meta.pk if name == 'pk' else model._meta.get_field(name)
+
+    def decode_cursor(self, request, model):
+        """
+        Значения курсора приводятся к типам полей сортировки, чтобы
+        подделанный курсор давал 404, а не ошибку в запросе.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode()))
+            values = cursor['v']
+            reverse = bool(cursor['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if (
+            not isinstance(values, list)
+            or len(values) != len(self.ordering)
+            or not all(
+                isinstance(value, (str, int, float))
+                and not isinstance(value, bool)
+                for value in values
+            )
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            values = [
+                self.get_ordering_field(model, field).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (ValidationError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
 
 
 class UserRecipePagination(PageNumberPagination):
+    """
+    Постраничная пагинация с переключением на курсорную.
+
+    Курсорный режим включается параметром ?pagination=cursor (или наличием
+    ?cursor=), порядок задается атрибутом cursor_ordering представления.
+    COUNT кэшируется, только если представление отдает версию данных
+    методом get_cache_version.
+    """
+
     page_size = 6
     page_size_query_param = 'limit'
+    mode_query_param = 'pagination'
+    django_paginator_class = CachedCountPaginator
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or KeysetPagination.cursor_query_param in request.query_params
+        ):
+            self.keyset = KeysetPagination(
+                ordering=getattr(view, 'cursor_ordering', ('-pk', )),
+                page_size=self.get_page_size(request),
+            )
+            return self.keyset.paginate_queryset(queryset, request, view)
+        get_cache_version = getattr(view, 'get_cache_version', None)
+        self.django_paginator_class = partial(
+            CachedCountPaginator,
+            version=get_cache_version(request) if get_cache_version else None
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,34 @@
+import json
+
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class MultiPartJSONParser(MultiPartParser):
+    """
+    multipart/form-data, в котором поля-массивы и поля-объекты
+    из json_fields передаются строками JSON. Остальные поля остаются
+    строками, даже если похожи на JSON.
+
+    Файлы Django сохраняет во временные файлы по мере чтения запроса,
+    так что изображение не попадает в память целиком.
+    """
+
+    json_fields = ('tags', 'ingredients')
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        result = super().parse(stream, media_type, parser_context)
+        data = {}
+        for key, values in result.data.lists():
+            if key in self.json_fields:
+                values = [self.decode(value) for value in values]
+            data[key] = values if len(values) > 1 else values[0]
+        return DataAndFiles(data, dict(result.files.items()))
+
+    @staticmethod
+    def decode(value):
+        if not value.lstrip().startswith(('[', '{')):
+            return value
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
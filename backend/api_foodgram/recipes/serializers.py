@@ -1,12 +1,35 @@
+from collections import Counter
+from hashlib import md5
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Manager, Prefetch, prefetch_related_objects
 from rest_framework import serializers
 
-from api_foodgram.fields import Base64ImageField
+from api_foodgram.fields import (Base64ImageField,
+                                 BulkPrimaryKeyRelatedField,
+                                 ImageDerivativesField, get_objects_by_ids)
+from api_foodgram.relations import get_relations
 from api_foodgram.tags.serializers import TagSerializer
 from api_foodgram.users.serializers import UserSerializer
+from api_foodgram.versions import bump_versions, get_versions
 from ingredients.models import Ingredient
-from recipes.models import Favorite, IngredientsinRecipe, Recipe, ShoppingCart
+from recipes.models import (Favorite, IngredientsinRecipe, Recipe,
+                            ShoppingCart, ShoppingListItem)
+from recipes.feed import add_recipe_to_feeds
+from recipes.images import schedule_image_derivatives
+from recipes.search import update_search_index
+from recipes.shopping_list import change_recipe_in_shopping_lists
 from tags.models import Tag
 
+# Срок не ограничивает устаревание: версии хранятся в БД и меняются
+# при любом изменении рецепта, в том числе из management-команд.
+RECIPE_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_duplicates(ids):
+    return [pk for pk, count in Counter(ids).items() if count > 1]
+
 
 class IngredientRecipeSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='ingredient.id')
@@ -25,8 +48,22 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
         )
 
 
+class ShoppingListItemSerializer(IngredientRecipeSerializer):
+
+    class Meta:
+        model = ShoppingListItem
+        fields = (
+            'id',
+            'name',
+            'measurement_unit',
+            'amount'
+        )
+
+
 class IngredientRecipeCreateSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    # Ингредиенты проверяются одним запросом в
+    # RecipeCreateSerializer.validate_ingredients.
+    id = serializers.IntegerField()
 
     class Meta:
         model = IngredientsinRecipe
@@ -38,8 +75,12 @@ class IngredientRecipeCreateSerializer(serializers.ModelSerializer):
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     ingredients = IngredientRecipeCreateSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all()
+    tags = BulkPrimaryKeyRelatedField(
+        many=True,
+        queryset=Tag.objects.all(),
+        error_messages={
+            'does_not_exist_many': 'Не найдены теги с id: {pk_values}'
+        }
     )
     image = Base64ImageField(use_url=True)
 
@@ -54,71 +95,175 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             'cooking_time'
         )
 
-    def validate(self, data):
-        ingredients = data['ingredients']
-        tags = data['tags']
-        unique_ingredients = []
-        unique_tags = []
-        for ingredient in ingredients:
-            if ingredient['id'] in unique_ingredients:
-                raise serializers.ValidationError(
-                    'Вы не можете в рецепте использовать один '
-                    'и тот же ингредиент больше одного раза'
-                )
-            else:
-                unique_ingredients.append(ingredient['id'])
-        for tag in tags:
-            if tag in unique_tags:
-                raise serializers.ValidationError(
-                    'Вы не можете использовать в рецепте один '
-                    'и тот же тег больше одного раза'
-                )
-            else:
-                unique_tags.append(tag)
-        return super().validate(data)
+    def validate_ingredients(self, ingredients):
+        ids = [ingredient['id'] for ingredient in ingredients]
+        if get_duplicates(ids):
+            raise serializers.ValidationError(
+                'Вы не можете в рецепте использовать один '
+                'и тот же ингредиент больше одного раза'
+            )
+        objects = get_objects_by_ids(
+            Ingredient.objects.all(),
+            ids,
+            'Не найдены ингредиенты с id: {pk_values}'
+        )
+        for ingredient, obj in zip(ingredients, objects):
+            ingredient['id'] = obj
+        return ingredients
+
+    def validate_tags(self, tags):
+        if get_duplicates(tag.id for tag in tags):
+            raise serializers.ValidationError(
+                'Вы не можете использовать в рецепте один '
+                'и тот же тег больше одного раза'
+            )
+        return tags
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags)
-        self.add_ingredients(ingredients, recipe)
+        self.set_tags(recipe, tags, current=())
+        self.set_ingredients(recipe, ingredients, current=())
+        add_recipe_to_feeds(recipe.id)
+        update_search_index([recipe.id])
+        schedule_image_derivatives(recipe)
+        bump_versions(f'recipe:{recipe.id}', 'recipes')
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        recipe = instance
-        instance.tags.clear()
-        instance.ingredients.clear()
-        tags = validated_data.pop('tags')
-        recipe.tags.set(tags)
-        ingredients = validated_data.pop('ingredients')
-        self.add_ingredients(ingredients, recipe)
-        return super().update(instance, validated_data)
-
-    def add_ingredients(self, ingredients, recipe):
-        IngredientsinRecipe.objects.bulk_create(
-            [
-                IngredientsinRecipe(
-                    recipe=recipe,
-                    ingredient=ingredient.pop('id'),
-                    amount=ingredient.pop('amount')
-                )
-                for ingredient in ingredients
-            ]
-        )
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        if 'image' in validated_data:
+            validated_data['image_digest'] = ''
+        recipe = super().update(instance, validated_data)
+        if tags is not None:
+            self.set_tags(recipe, tags)
+        else:
+            recipe.written_tags = list(recipe.tags.order_by('id'))
+        if ingredients is not None:
+            change_recipe_in_shopping_lists(
+                recipe.id, *self.set_ingredients(recipe, ingredients)
+            )
+        else:
+            recipe.written_ingredients = list(
+                recipe.ingredients_in_recipe.select_related(
+                    'ingredient'
+                ).order_by('id')
+            )
+        update_search_index([recipe.id])
+        if 'image' in validated_data:
+            schedule_image_derivatives(recipe)
+        bump_versions(f'recipe:{recipe.id}', 'recipes')
+        return recipe
+
+    def set_tags(self, recipe, tags, current=None):
+        """
+        Приводит теги рецепта к tags, меняя только отличающиеся строки.
+        Итоговые теги сохраняет в recipe.written_tags для ответа.
+        """
+        through = Recipe.tags.through
+        if current is None:
+            current = set(through.objects.filter(
+                recipe=recipe
+            ).values_list('tag_id', flat=True))
+        tags = {tag.id: tag for tag in tags}
+        removed = set(current) - tags.keys()
+        if removed:
+            through.objects.filter(recipe=recipe, tag_id__in=removed).delete()
+        through.objects.bulk_create([
+            through(recipe=recipe, tag=tag)
+            for tag_id, tag in tags.items() if tag_id not in current
+        ])
+        recipe.written_tags = [tags[tag_id] for tag_id in sorted(tags)]
+
+    def set_ingredients(self, recipe, ingredients, current=None):
+        """
+        Приводит ингредиенты рецепта к ingredients: удаляет лишние строки,
+        меняет количество у изменившихся и добавляет новые. Итоговые
+        строки в порядке id сохраняет в recipe.written_ingredients
+        для ответа. Возвращает количества по id ингредиента до и после
+        изменения.
+        """
+        if current is None:
+            current = list(recipe.ingredients_in_recipe.select_related(
+                'ingredient'
+            ).order_by('id'))
+        amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        old_amounts = {row.ingredient_id: row.amount for row in current}
+        changed, removed = [], []
+        for row in current:
+            if row.ingredient_id not in amounts:
+                removed.append(row.id)
+                continue
+            if row.amount != amounts[row.ingredient_id]:
+                row.amount = amounts[row.ingredient_id]
+                changed.append(row)
+        added = [
+            IngredientsinRecipe(
+                recipe=recipe,
+                ingredient=ingredient['id'],
+                amount=ingredient['amount']
+            )
+            for ingredient in ingredients
+            if ingredient['id'].id not in old_amounts
+        ]
+        if removed:
+            IngredientsinRecipe.objects.filter(id__in=removed).delete()
+        if changed:
+            IngredientsinRecipe.objects.bulk_update(changed, ['amount'])
+        if added:
+            IngredientsinRecipe.objects.bulk_create(added)
+        recipe.written_ingredients = [
+            row for row in current if row.id not in removed
+        ] + added
+        return old_amounts, amounts
 
     def to_representation(self, instance):
-        return RecipeSerializer(
+        return RecipeResponseSerializer(
             instance, context={'request': self.context.get('request')}).data
 
 
+class RecipeListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, Manager) else data
+        return self.child.to_representation_many(list(recipes))
+
+
 class RecipeSerializer(serializers.ModelSerializer):
-    ingredients = serializers.SerializerMethodField()
+    """
+    Рецепт с пользовательскими флагами.
+
+    Общая для всех пользователей часть представления кэшируется по версии
+    рецепта, тегов и ингредиентов, флаги is_favorited, is_in_shopping_cart
+    и author.is_subscribed накладываются при каждом ответе.
+    """
+
+    prefetch_lookups = (
+        'author',
+        Prefetch('tags', queryset=Tag.objects.order_by('id')),
+        Prefetch(
+            'ingredients_in_recipe',
+            queryset=IngredientsinRecipe.objects.select_related(
+                'ingredient'
+            ).order_by('id')
+        ),
+    )
+    ingredients = IngredientRecipeSerializer(
+        source='ingredients_in_recipe',
+        many=True
+    )
     tags = TagSerializer(many=True)
     author = UserSerializer()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField(use_url=True)
+    images = ImageDerivativesField()
 
     class Meta:
         model = Recipe
@@ -131,35 +276,96 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'images',
             'text',
             'cooking_time'
         )
+        list_serializer_class = RecipeListSerializer
 
-    def get_ingredients(self, obj):
-        ingredients = IngredientsinRecipe.objects.filter(recipe=obj)
-        return IngredientRecipeSerializer(ingredients, many=True).data
+    def to_representation(self, instance):
+        return self.to_representation_many([instance])[0]
 
-    def get_is_in_shopping_cart(self, obj):
-        return (
-            not self.context.get('request').user.is_anonymous
-            and ShoppingCart.objects.filter(
-                user=self.context.get('request').user,
-                recipe=obj
-            ).exists()
+    def to_representation_many(self, recipes):
+        shared = self.get_shared_representations(recipes)
+        relations = get_relations(self.context.get('request'))
+        representations = []
+        for recipe in recipes:
+            data = shared[recipe.id]
+            data['is_favorited'] = recipe.id in relations.favorites
+            data['is_in_shopping_cart'] = (
+                recipe.id in relations.shopping_cart
+            )
+            data['author']['is_subscribed'] = (
+                recipe.author_id in relations.subscriptions
+            )
+            representations.append(data)
+        return representations
+
+    def get_shared_representations(self, recipes):
+        request = self.context.get('request')
+        base_url = request.build_absolute_uri('/') if request else ''
+        versions = get_versions(
+            'tags',
+            'ingredients',
+            *(f'recipe:{recipe.id}' for recipe in recipes),
+            request=request
         )
+        keys = {
+            recipe.id: 'recipe:{}:{}'.format(recipe.id, md5(
+                '{}:{}:{}:{}'.format(
+                    versions[f'recipe:{recipe.id}'],
+                    versions['tags'],
+                    versions['ingredients'],
+                    base_url,
+                ).encode()
+            ).hexdigest())
+            for recipe in recipes
+        }
+        cached = cache.get_many(keys.values())
+        shared = {
+            recipe_id: cached[key]
+            for recipe_id, key in keys.items() if key in cached
+        }
+        missing = [recipe for recipe in recipes if recipe.id not in shared]
+        if missing:
+            prefetch_related_objects(missing, *self.prefetch_lookups)
+            built = {}
+            for recipe in missing:
+                built[recipe.id] = super().to_representation(recipe)
+            cache.set_many(
+                {keys[recipe_id]: data for recipe_id, data in built.items()},
+                RECIPE_CACHE_TIMEOUT
+            )
+            shared.update(built)
+        return shared
+
+    def get_is_in_shopping_cart(self, obj):
+        return obj.id in get_relations(
+            self.context.get('request')
+        ).shopping_cart
 
     def get_is_favorited(self, obj):
-        return (
-            not self.context.get('request').user.is_anonymous
-            and Favorite.objects.filter(
-                user=self.context.get('request').user,
-                recipe=obj
-            ).exists()
-        )
+        return obj.id in get_relations(self.context.get('request')).favorites
+
+
+class RecipeResponseSerializer(RecipeSerializer):
+    """
+    Ответ на создание и изменение рецепта: теги и ингредиенты берутся
+    из written_tags и written_ingredients, уже загруженных при записи,
+    в том же порядке, что и у RecipeSerializer.
+    """
+
+    prefetch_lookups = ('author', )
+    ingredients = IngredientRecipeSerializer(
+        source='written_ingredients',
+        many=True
+    )
+    tags = TagSerializer(source='written_tags', many=True)
 
 
 class RecipeInFavoriteOrCartSerializer(serializers.ModelSerializer):
     image = Base64ImageField(use_url=True)
+    images = ImageDerivativesField()
 
     class Meta:
         model = Recipe
@@ -167,6 +373,7 @@ class RecipeInFavoriteOrCartSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'images',
             'cooking_time'
         )
 
@@ -177,27 +384,6 @@ class ShoppingCartCreateSerializer(serializers.ModelSerializer):
         model = ShoppingCart
         fields = ('user', 'recipe')
 
-    def validate(self, attrs):
-        ending = self.context.get('ending')
-        if self.context.get('request').method == 'POST':
-            if self.Meta.model.objects.filter(
-                user=attrs['user'],
-                recipe=attrs['recipe']
-            ).exists():
-                raise serializers.ValidationError(
-                    f'Этот рецепт уже находится в {ending}'
-                )
-            return attrs
-        if self.context.get('request').method == 'DELETE':
-            if not self.Meta.model.objects.filter(
-                user=attrs['user'],
-                recipe=attrs['recipe']
-            ).exists():
-                raise serializers.ValidationError(
-                    f'Этого рецепта нет в {ending}'
-                )
-            return attrs
-
     def to_representation(self, instance):
         return RecipeInFavoriteOrCartSerializer(
             instance.recipe,
@@ -1,25 +1,42 @@
-from django.db.models import Sum
-from django.http import FileResponse
+from django.core.files.storage import default_storage
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import (APIException, NotFound,
+                                       ValidationError)
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
 
 from api_foodgram.filters import RecipeFilter
-from api_foodgram.mixins import UpdateModelMixin
-from api_foodgram.pagination import UserRecipePagination
+from api_foodgram.mixins import (BatchRelationMixin, ConditionalGetMixin,
+                                 UpdateModelMixin)
+from api_foodgram.negotiation import IgnoreFormatNegotiation
+from api_foodgram.pagination import KeysetPagination, UserRecipePagination
+from api_foodgram.parsers import MultiPartJSONParser
 from api_foodgram.permissions import IsAuthorOrReadOnly
+from api_foodgram.relations import add_relation, remove_relation
 from api_foodgram.recipes.serializers import (FavoriteCreateSerializer,
                                               RecipeCreateSerializer,
                                               RecipeSerializer,
-                                              ShoppingCartCreateSerializer)
-from api_foodgram.utils import get_pdf
-from recipes.models import Favorite, IngredientsinRecipe, Recipe, ShoppingCart
+                                              ShoppingCartCreateSerializer,
+                                              ShoppingListItemSerializer)
+from api_foodgram.shopping_list import (STREAM_FORMATS, RenderError,
+                                        get_digest, get_or_render_pdf,
+                                        get_pdf_status, get_shopping_list,
+                                        get_shopping_list_queryset)
+from recipes.models import (Favorite, FeedItem, Recipe, ShoppingCart,
+                            ShoppingListItem)
+from recipes.popularity import POPULAR_ORDERING, TRENDING_ORDERING
 
 
 class RecipeViewSet(
+    BatchRelationMixin,
+    ConditionalGetMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
     mixins.DestroyModelMixin,
@@ -28,10 +45,37 @@ class RecipeViewSet(
     viewsets.GenericViewSet
 ):
     queryset = Recipe.objects.all()
+    lookup_value_regex = r'\d+'
     pagination_class = UserRecipePagination
+    parser_classes = (JSONParser, MultiPartJSONParser)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     permission_classes = (IsAuthorOrReadOnly, )
+    user_dependent = True
+
+    @property
+    def cursor_ordering(self):
+        """
+        Порядок курсорной пагинации. Курсоры по популярности и трендам
+        стабильны лишь приблизительно: счетчики меняются между запросами,
+        и рецепт может пропасть или повториться на соседних страницах.
+        """
+        if self.action == 'trending':
+            return TRENDING_ORDERING
+        if self.request.query_params.get('ordering') == 'popular':
+            return POPULAR_ORDERING
+        return ('-pub_date', '-id')
+
+    def get_version_names(self):
+        if self.action == 'retrieve':
+            return (f'recipe:{self.kwargs[self.lookup_field]}', 'tags',
+                    'ingredients')
+        if (
+            self.action == 'trending'
+            or self.request.query_params.get('ordering') == 'popular'
+        ):
+            return ('recipes', 'popularity')
+        return ('recipes', )
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -46,75 +90,194 @@ class RecipeViewSet(
         detail=True,
     )
     def favorite(self, request, pk):
-        user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-        serializer = FavoriteCreateSerializer(
-            data={'user': user.id, 'recipe': recipe.id},
-            context={'request': request, 'ending': 'избранном'}
-        )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(
-            serializer.data,
-            status=status.HTTP_201_CREATED
+        return self.create_relation(
+            Favorite, FavoriteCreateSerializer, pk, 'избранном'
         )
 
     @favorite.mapping.delete
     def delete_favorite(self, request, pk):
-        user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-        serializer = FavoriteCreateSerializer(
-            data={'user': user.id, 'recipe': recipe.id},
-            context={'request': request, 'ending': 'избранном'}
-        )
-        serializer.is_valid(raise_exception=True)
-        Favorite.objects.filter(user=user, recipe=recipe).delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        return self.destroy_relation(Favorite, pk, 'избранном')
 
     @action(
         methods=['post'],
         detail=True,
     )
     def shopping_cart(self, request, pk):
-        user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-        serializer = ShoppingCartCreateSerializer(
-            data={'user': user.id, 'recipe': recipe.id},
-            context={'request': request, 'ending': 'корзине'}
-        )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(
-            serializer.data,
-            status=status.HTTP_201_CREATED
+        return self.create_relation(
+            ShoppingCart, ShoppingCartCreateSerializer, pk, 'корзине'
         )
 
     @shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, pk):
-        user = request.user
+        return self.destroy_relation(ShoppingCart, pk, 'корзине')
+
+    @action(
+        methods=['post', 'delete'],
+        detail=False,
+        permission_classes=(IsAuthenticated, ),
+        url_path='favorite',
+        url_name='favorite-batch'
+    )
+    def favorite_batch(self, request):
+        return self.update_recipe_relations(Favorite, 'избранном')
+
+    @action(
+        methods=['post', 'delete'],
+        detail=False,
+        permission_classes=(IsAuthenticated, ),
+        url_path='shopping_cart',
+        url_name='shopping-cart-batch'
+    )
+    def shopping_cart_batch(self, request):
+        return self.update_recipe_relations(ShoppingCart, 'корзине')
+
+    def update_recipe_relations(self, model, ending):
+        return self.update_relations(
+            self.request, model, 'recipe', Recipe.objects.all(), {
+                'exists': f'Этот рецепт уже находится в {ending}',
+                'missing': f'Этого рецепта нет в {ending}',
+                'not_found': 'Рецепт не найден',
+            }
+        )
+
+    def create_relation(self, model, serializer_class, pk, ending):
         recipe = get_object_or_404(Recipe, pk=pk)
-        serializer = ShoppingCartCreateSerializer(
-            data={'user': user.id, 'recipe': recipe.id},
-            context={'request': request, 'ending': 'корзине'}
+        relation = add_relation(model, user=self.request.user, recipe=recipe)
+        if relation is None:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                f'Этот рецепт уже находится в {ending}'
+            ]})
+        serializer = serializer_class(
+            relation, context={'request': self.request}
         )
-        serializer.is_valid(raise_exception=True)
-        ShoppingCart.objects.filter(user=user, recipe=recipe).delete()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def destroy_relation(self, model, pk, ending):
+        if not remove_relation(model, user=self.request.user, recipe=pk):
+            get_object_or_404(Recipe, pk=pk)
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                f'Этого рецепта нет в {ending}'
+            ]})
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        methods=['get'],
+        detail=False,
+    )
+    def trending(self, request):
+        queryset = self.filter_queryset(
+            Recipe.objects.filter(trending_score__gt=0)
+        ).order_by(*TRENDING_ORDERING)
+        page = self.paginate_queryset(queryset)
+        serializer = RecipeSerializer(
+            page, many=True, context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=(IsAuthenticated, )
+    )
+    def feed(self, request):
+        paginator = KeysetPagination(
+            ordering=('-pub_date', '-recipe_id'),
+            page_size=self.paginator.get_page_size(request)
+        )
+        items = paginator.paginate_queryset(
+            FeedItem.objects.filter(user=request.user).select_related(
+                'recipe'
+            ),
+            request,
+            self
+        )
+        serializer = RecipeSerializer(
+            [item.recipe for item in items],
+            many=True,
+            context={'request': request}
+        )
+        return paginator.get_paginated_response(serializer.data)
+
     @action(
         methods=['get'],
         detail=False,
         permission_classes=(IsAuthenticated, )
     )
+    def shopping_list(self, request):
+        items = ShoppingListItem.objects.filter(
+            user=request.user
+        ).select_related(
+            'ingredient'
+        ).order_by(
+            'ingredient__name', 'ingredient_id'
+        )
+        return Response(ShoppingListItemSerializer(items, many=True).data)
+
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=(IsAuthenticated, ),
+        content_negotiation_class=IgnoreFormatNegotiation
+    )
     def download_shopping_cart(self, request):
-        ingredients = IngredientsinRecipe.objects.filter(
-            recipe__shopping_recipes__user=request.user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(Sum('amount'))
+        file_format = request.query_params.get('format', 'pdf')
+        if file_format in STREAM_FORMATS:
+            stream, content_type = STREAM_FORMATS[file_format]
+            response = StreamingHttpResponse(
+                stream(get_shopping_list_queryset(request.user).iterator()),
+                content_type=content_type
+            )
+            response['Content-Disposition'] = (
+                f'attachment; filename="ingredients.{file_format}"'
+            )
+            return response
+        if file_format != 'pdf':
+            raise ValidationError({'format': [
+                'Доступные форматы: pdf, ' + ', '.join(STREAM_FORMATS)
+            ]})
+        # Ответ 202 с адресом для опроса - только по явному запросу
+        # клиента, по умолчанию файл отдается сразу.
+        digest, name = get_or_render_pdf(
+            get_shopping_list(request.user),
+            background=request.query_params.get('async') in ('1', 'true')
+        )
+        if name is None:
+            return self.get_pending_response(request, digest)
+        return self.get_pdf_response(name)
+
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=(IsAuthenticated, ),
+        url_path=r'download_shopping_cart/(?P<digest>[0-9a-f]{64})'
+    )
+    def download_shopping_cart_file(self, request, digest):
+        # Отдается только файл текущего списка покупок пользователя.
+        if digest != get_digest(get_shopping_list(request.user)):
+            raise NotFound('Список покупок не найден')
+        try:
+            name = get_pdf_status(digest)
+        except FileNotFoundError:
+            raise NotFound('Список покупок не найден')
+        except RenderError:
+            raise APIException('Не удалось сформировать список покупок')
+        if name is None:
+            return self.get_pending_response(request, digest)
+        return self.get_pdf_response(name)
+
+    def get_pending_response(self, request, digest):
+        url = request.build_absolute_uri(reverse(
+            'recipes-download-shopping-cart-file', kwargs={'digest': digest}
+        ))
+        return Response(
+            {'detail': 'Список покупок формируется', 'url': url},
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': url, 'Retry-After': '1'}
+        )
+
+    def get_pdf_response(self, name):
         return FileResponse(
-            get_pdf(ingredients),
+            default_storage.open(name),
             as_attachment=True,
             filename='ingredients.pdf'
         )
@@ -0,0 +1,228 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Model
+from django.db.models.signals import post_delete, post_save
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription
+
+# Сброс по сигналу виден только процессу, в котором он произошел. Если
+# кэш не общий для воркеров, множества хранятся секунды, иначе другие
+# процессы отдавали бы устаревшие флаги до истечения срока.
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+RELATIONS_CACHE_TIMEOUT = (
+    5 if settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES
+    else 60 * 60 * 24
+)
+
+
+class UserRelations:
+    """
+    Множества id избранных рецептов, рецептов в корзине и авторов,
+    на которых подписан пользователь.
+
+    Загружаются один раз на запрос, между запросами хранятся в кэше
+    Django и сбрасываются сигналами при изменении связей. Версия - хэш
+    самих множеств, она входит в ETag ответов с пользовательскими
+    флагами и меняется только вместе со связями, а не при каждом
+    истечении записи в кэше.
+    """
+
+    def __init__(self, favorites=(), shopping_cart=(), subscriptions=(),
+                 version=''):
+        self.version = version
+        self.favorites = frozenset(favorites)
+        self.shopping_cart = frozenset(shopping_cart)
+        self.subscriptions = frozenset(subscriptions)
+
+    @staticmethod
+    def get_cache_key(user_id):
+        return f'user_relations:{user_id}'
+
+    @classmethod
+    def load(cls, user):
+        key = cls.get_cache_key(user.id)
+        relations = cache.get(key)
+        if relations is None:
+            relations = {
+                'favorites': sorted(Favorite.objects.filter(
+                    user=user
+                ).values_list('recipe_id', flat=True)),
+                'shopping_cart': sorted(ShoppingCart.objects.filter(
+                    user=user
+                ).values_list('recipe_id', flat=True)),
+                'subscriptions': sorted(Subscription.objects.filter(
+                    user=user
+                ).values_list('author_id', flat=True)),
+            }
+            relations['version'] = md5(
+                repr(sorted(relations.items())).encode()
+            ).hexdigest()
+            cache.set(key, relations, RELATIONS_CACHE_TIMEOUT)
+        return cls(**relations)
+
+    @classmethod
+    def invalidate(cls, user_id):
+        cache.delete(cls.get_cache_key(user_id))
+
+
+def get_relations(request):
+    if request is None or request.user.is_anonymous:
+        return UserRelations()
+    relations = getattr(request, '_user_relations', None)
+    if relations is None:
+        relations = UserRelations.load(request.user)
+        request._user_relations = relations
+    return relations
+
+
+def invalidate_relations(request):
+    UserRelations.invalidate(request.user.id)
+    request._user_relations = None
+
+
+def get_relation_columns(model, values):
+    """Столбцы, параметры запроса и аргументы для создания объекта связи."""
+    columns, params, attrs = [], [], {}
+    for name, value in values.items():
+        field = model._meta.get_field(name)
+        if isinstance(value, Model):
+            attrs[name] = value
+            value = value.pk
+        value = field.get_db_prep_value(value, connection)
+        attrs.setdefault(field.attname, value)
+        columns.append(field.column)
+        params.append(value)
+    return columns, params, attrs
+
+
+def add_relation(model, **values):
+    """
+    Создает связь одним INSERT ... ON CONFLICT DO NOTHING, поэтому
+    одновременные запросы не упираются в уникальное ограничение.
+    Вставка и обработчики сигнала выполняются в одной транзакции.
+
+    Возвращает объект связи с id из RETURNING или None, если связь уже
+    была. Сигнал post_save отправляется вручную, только когда строка
+    добавлена.
+    """
+    columns, params, attrs = get_relation_columns(model, values)
+    pk = model._meta.pk
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {model._meta.db_table} '
+                f'({", ".join(columns)}) '
+                f'VALUES ({", ".join(["%s"] * len(params))}) '
+                f'ON CONFLICT DO NOTHING RETURNING {pk.column}',
+                params
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+        attrs[pk.attname] = row[0]
+        instance = model(**attrs)
+        instance._state.adding = False
+        post_save.send(
+            sender=model, instance=instance, created=True,
+            update_fields=None, raw=False, using=connection.alias
+        )
+    return instance
+
+
+def remove_relation(model, **values):
+    """
+    Удаляет связь одним DELETE и сообщает, была ли она. Сигнал
+    post_delete отправляется вручную, только когда строка удалена.
+    """
+    columns, params, attrs = get_relation_columns(model, values)
+    pk = model._meta.pk
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {model._meta.db_table} WHERE '
+                + ' AND '.join(f'{column} = %s' for column in columns)
+                + f' RETURNING {pk.column}',
+                params
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return False
+        attrs[pk.attname] = row[0]
+        post_delete.send(
+            sender=model, instance=model(**attrs), using=connection.alias
+        )
+    return True
+
+
+def send_relation_signals(signal, model, user, field, rows, **kwargs):
+    """rows - пары (id связи, id объекта) из RETURNING."""
+    for pk, target_id in rows:
+        signal.send(
+            sender=model,
+            instance=model(**{
+                model._meta.pk.attname: pk,
+                'user': user,
+                model._meta.get_field(field).attname: target_id
+            }),
+            using=connection.alias,
+            **kwargs
+        )
+
+
+def add_relations(model, user, field, ids):
+    """
+    Связывает пользователя с объектами ids одним INSERT на все строки.
+    Возвращает множество id, для которых связь действительно создана.
+    """
+    ids = list(ids)
+    if not ids:
+        return set()
+    user_column = model._meta.get_field('user').column
+    column = model._meta.get_field(field).column
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {model._meta.db_table} '
+                f'({user_column}, {column}) '
+                f'VALUES {", ".join(["(%s, %s)"] * len(ids))} '
+                f'ON CONFLICT DO NOTHING '
+                f'RETURNING {model._meta.pk.column}, {column}',
+                [value for target_id in ids for value in (user.id, target_id)]
+            )
+            rows = cursor.fetchall()
+        send_relation_signals(
+            post_save, model, user, field, rows,
+            created=True, update_fields=None, raw=False
+        )
+    return {target_id for _, target_id in rows}
+
+
+def remove_relations(model, user, field, ids):
+    """
+    Удаляет связи пользователя с объектами ids одним DELETE.
+    Возвращает множество id, для которых связь была.
+    """
+    ids = list(ids)
+    if not ids:
+        return set()
+    user_column = model._meta.get_field('user').column
+    column = model._meta.get_field(field).column
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {model._meta.db_table} '
+                f'WHERE {user_column} = %s '
+                f'AND {column} IN ({", ".join(["%s"] * len(ids))}) '
+                f'RETURNING {model._meta.pk.column}, {column}',
+                [user.id, *ids]
+            )
+            rows = cursor.fetchall()
+        send_relation_signals(post_delete, model, user, field, rows)
+    return {target_id for _, target_id in rows}
@@ -0,0 +1,14 @@
+from rest_framework import serializers
+
+from backend.constants import MAX_BATCH_SIZE
+
+
+class IdListSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BATCH_SIZE,
+        error_messages={
+            'max_length': 'Список не может содержать больше {max_length} id'
+        }
+    )
@@ -0,0 +1,202 @@
+"""
+Список покупок: чтение сумм ингредиентов корзины, потоковая выгрузка
+в текстовых форматах и рендеринг PDF.
+
+Суммы хранятся готовыми в ShoppingListItem и обновляются при изменении
+корзины и рецептов (см. recipes.shopping_list), так что чтение списка -
+выборка по индексу без агрегирования.
+
+Готовые PDF сохраняются в хранилище под хешем содержимого списка, так
+что повторное скачивание неизменившейся корзины не рендерит файл заново,
+и удаляются через PDF_TIMEOUT. По запросу клиента большие списки
+рендерятся в фоновом потоке, а клиент опрашивает готовность.
+"""
+
+import csv
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from hashlib import sha256
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.utils import timezone
+
+from api_foodgram.utils import get_pdf
+from recipes.models import ShoppingListItem
+
+PDF_DIRECTORY = 'shopping_lists'
+SYNC_RENDER_LIMIT = 200
+PENDING_TIMEOUT = 60 * 5
+PDF_TIMEOUT = 60 * 60 * 24
+CLEANUP_INTERVAL = 60 * 60
+CLEANUP_KEY = 'shopping_list_cleanup'
+
+PENDING = 'pending'
+FAILED = 'failed'
+
+executor = ThreadPoolExecutor(max_workers=2)
+logger = logging.getLogger(__name__)
+
+
+class RenderError(Exception):
+    """Фоновый рендеринг PDF завершился ошибкой."""
+
+
+def get_shopping_list_queryset(user):
+    return ShoppingListItem.objects.filter(
+        user=user
+    ).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        amount__sum=F('amount')
+    ).order_by(
+        'ingredient__name', 'ingredient_id'
+    )
+
+
+def get_shopping_list(user):
+    return list(get_shopping_list_queryset(user))
+
+
+class Echo:
+    """Буфер для csv.writer, который сразу отдает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            ingredient['amount__sum'],
+        ))
+
+
+def stream_txt(ingredients):
+    for ingredient in ingredients:
+        yield (
+            f"{ingredient['ingredient__name']} - "
+            f"{ingredient['amount__sum']} "
+            f"{ingredient['ingredient__measurement_unit']}\n"
+        )
+
+
+def stream_json(ingredients):
+    separator = '['
+    for ingredient in ingredients:
+        yield separator + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+            'amount': ingredient['amount__sum'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+STREAM_FORMATS = {
+    'csv': (stream_csv, 'text/csv; charset=utf-8'),
+    'txt': (stream_txt, 'text/plain; charset=utf-8'),
+    'json': (stream_json, 'application/json'),
+}
+
+
+def get_digest(ingredients):
+    return sha256(
+        json.dumps(ingredients, ensure_ascii=False).encode()
+    ).hexdigest()
+
+
+def get_pdf_name(digest):
+    return f'{PDF_DIRECTORY}/{digest}.pdf'
+
+
+def get_pending_key(digest):
+    return f'shopping_list_pending:{digest}'
+
+
+def delete_expired_pdfs():
+    """
+    Удаляет PDF старше PDF_TIMEOUT. Вызывается при рендеринге, каталог
+    просматривается не чаще раза в CLEANUP_INTERVAL.
+    """
+    if not cache.add(CLEANUP_KEY, True, CLEANUP_INTERVAL):
+        return
+    if not default_storage.exists(PDF_DIRECTORY):
+        return
+    deadline = timezone.now() - timedelta(seconds=PDF_TIMEOUT)
+    for file_name in default_storage.listdir(PDF_DIRECTORY)[1]:
+        name = f'{PDF_DIRECTORY}/{file_name}'
+        try:
+            if default_storage.get_modified_time(name) < deadline:
+                default_storage.delete(name)
+        except FileNotFoundError:
+            continue
+
+
+def render_pdf(digest, ingredients):
+    name = get_pdf_name(digest)
+    try:
+        if not default_storage.exists(name):
+            pdf = get_pdf(ingredients).read()
+            default_storage.save(name, ContentFile(pdf))
+    finally:
+        cache.delete(get_pending_key(digest))
+    delete_expired_pdfs()
+    return name
+
+
+def render_pdf_in_background(digest, ingredients):
+    """
+    render_pdf для executor: результат future никто не проверяет, поэтому
+    ошибка пишется в лог и в статус, который увидит опрос готовности.
+    """
+    try:
+        render_pdf(digest, ingredients)
+    except Exception:
+        logger.exception('Не удалось сформировать PDF списка %s', digest)
+        cache.set(get_pending_key(digest), FAILED, PENDING_TIMEOUT)
+
+
+def get_or_render_pdf(ingredients, background=False):
+    """
+    Возвращает (digest, имя файла) для готового PDF или (digest, None),
+    если файл рендерится в фоне. В фоне рендерятся только списки длиннее
+    SYNC_RENDER_LIMIT и только при background=True.
+    """
+    digest = get_digest(ingredients)
+    name = get_pdf_name(digest)
+    if default_storage.exists(name):
+        return digest, name
+    if not background or len(ingredients) <= SYNC_RENDER_LIMIT:
+        return digest, render_pdf(digest, ingredients)
+    key = get_pending_key(digest)
+    if cache.add(key, PENDING, PENDING_TIMEOUT) or cache.get(key) == FAILED:
+        # После ошибки повторный запрос списка запускает рендеринг снова.
+        cache.set(key, PENDING, PENDING_TIMEOUT)
+        executor.submit(render_pdf_in_background, digest, ingredients)
+    return digest, None
+
+
+def get_pdf_status(digest):
+    """
+    Имя готового файла или None для рендерящегося. Если рендеринг
+    завершился ошибкой, исключение RenderError, если файла нет -
+    FileNotFoundError.
+    """
+    name = get_pdf_name(digest)
+    if default_storage.exists(name):
+        return name
+    status = cache.get(get_pending_key(digest))
+    if status == FAILED:
+        raise RenderError(name)
+    if status:
+        return None
+    raise FileNotFoundError(name)
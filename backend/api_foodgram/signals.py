@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from api_foodgram.relations import UserRelations
+from api_foodgram.versions import bump_versions
+from ingredients.models import Ingredient
+from recipes.models import (Favorite, IngredientsinRecipe, Recipe,
+                            ShoppingCart)
+from tags.models import Tag
+from users.models import Subscription
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+def invalidate_user_relations(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: UserRelations.invalidate(user_id))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def bump_popularity_version(sender, **kwargs):
+    # Порядок ?ordering=popular зависит от избранного всех пользователей.
+    bump_versions('popularity')
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def bump_recipe_version(sender, instance, **kwargs):
+    bump_versions(f'recipe:{instance.id}', 'recipes')
+
+
+@receiver(post_save, sender=IngredientsinRecipe)
+@receiver(post_delete, sender=IngredientsinRecipe)
+def bump_recipe_ingredients_version(sender, instance, **kwargs):
+    bump_versions(f'recipe:{instance.recipe_id}', 'recipes')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipe_tags_version(sender, instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    # Изменение со стороны тега затрагивает произвольный набор рецептов.
+    bump_versions('tags' if reverse else f'recipe:{instance.id}', 'recipes')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tags_version(sender, **kwargs):
+    bump_versions('tags', 'recipes')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_ingredients_version(sender, **kwargs):
+    bump_versions('ingredients', 'recipes')
+
+
+@receiver(post_save, sender=User)
+def bump_author_recipes_versions(sender, instance, created, update_fields,
+                                 **kwargs):
+    # Вход пользователя обновляет только last_login, он не попадает
+    # в представление рецепта.
+    if created or update_fields and set(update_fields) == {'last_login'}:
+        return
+    recipe_ids = list(instance.recipes.values_list('id', flat=True))
+    if recipe_ids:
+        bump_versions(
+            'recipes', *(f'recipe:{recipe_id}' for recipe_id in recipe_ids)
+        )
@@ -1,9 +1,11 @@
 from rest_framework import viewsets
 
+from api_foodgram.mixins import ConditionalGetMixin
 from api_foodgram.tags.serializers import TagSerializer
 from tags.models import Tag
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    version_names = ('tags', )
@@ -0,0 +1,87 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from ingredients.models import Ingredient
+from recipes.models import IngredientsinRecipe, Recipe, ShoppingCart
+from recipes.search import search_recipes
+from recipes.shopping_list import (get_expected_shopping_lists,
+                                   get_stored_shopping_lists)
+
+User = get_user_model()
+
+URL = '/admin/recipes/ingredientsinrecipe/'
+
+
+class IngredientsinRecipeAdminTest(TestCase):
+    """Правка состава рецепта в админке доходит до списков покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com',
+            password='password', first_name='Имя', last_name='Фамилия'
+        )
+        cls.salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        cls.sugar = Ingredient.objects.create(
+            name='сахар', measurement_unit='г'
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.admin, name=f'Рецепт {number}', text='Описание',
+                cooking_time=5, image='recipes/images/test.jpg'
+            )
+            for number in range(2)
+        ]
+        for recipe in cls.recipes:
+            IngredientsinRecipe.objects.create(
+                recipe=recipe, ingredient=cls.salt, amount=10
+            )
+            ShoppingCart.objects.create(user=cls.admin, recipe=recipe)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.link = IngredientsinRecipe.objects.filter(
+            recipe=self.recipes[0]
+        ).get()
+
+    def assert_shopping_lists(self):
+        self.assertEqual(
+            get_stored_shopping_lists(), get_expected_shopping_lists()
+        )
+
+    def post(self, url, data):
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+
+    def test_add_and_change(self):
+        self.post(f'{URL}add/', {
+            'recipe': self.recipes[0].id,
+            'ingredient': self.sugar.id,
+            'amount': 5,
+        })
+        self.assert_shopping_lists()
+        self.post(f'{URL}{self.link.id}/change/', {
+            'recipe': self.recipes[1].id,
+            'ingredient': self.sugar.id,
+            'amount': 7,
+        })
+        self.assert_shopping_lists()
+        self.assertEqual(
+            list(search_recipes(Recipe.objects.all(), 'сахар').order_by(
+                'id'
+            )),
+            self.recipes
+        )
+
+    def test_delete(self):
+        self.post(f'{URL}{self.link.id}/delete/', {'post': 'yes'})
+        self.assert_shopping_lists()
+        self.post(URL, {
+            'action': 'delete_selected',
+            '_selected_action': list(
+                IngredientsinRecipe.objects.values_list('id', flat=True)
+            ),
+            'post': 'yes',
+        })
+        self.assertFalse(IngredientsinRecipe.objects.exists())
+        self.assert_shopping_lists()
@@ -0,0 +1,94 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Recipe
+from recipes.popularity import change_counter
+
+User = get_user_model()
+
+
+class CounterSaveTest(TestCase):
+    """Сохранение прочитанного ранее объекта не затирает счетчики."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password', first_name='Имя', last_name='Фамилия'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Описание',
+            cooking_time=5, image='recipes/images/test.jpg'
+        )
+
+    def test_recipe(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        change_counter(Recipe, recipe.pk, 'favorites_count', 1)
+        change_counter(Recipe, recipe.pk, 'carts_count', 2)
+        recipe.name = 'Новое название'
+        recipe.save()
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.carts_count, 2)
+
+    def test_user(self):
+        user = User.objects.get(pk=self.author.pk)
+        change_counter(User, user.pk, 'followers_count', 3)
+        user.first_name = 'Другое'
+        user.save()
+        user = User.objects.get(pk=user.pk)
+        self.assertEqual(user.first_name, 'Другое')
+        self.assertEqual(user.followers_count, 3)
+
+    def test_deferred_fields(self):
+        recipe = Recipe.objects.only('name').get(pk=self.recipe.pk)
+        recipe.name = 'Только название'
+        with self.assertNumQueries(1):
+            recipe.save()
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe.pk).text, self.recipe.text
+        )
+
+    def test_explicit_update_fields(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        recipe.favorites_count = 7
+        recipe.save(update_fields=['favorites_count'])
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe.pk).favorites_count, 7
+        )
+
+
+class RollupCountersTest(TestCase):
+    """Списки по популярности обновляются после rollup_counters."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password', first_name='Имя', last_name='Фамилия'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Описание',
+            cooking_time=5, image='recipes/images/test.jpg'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_trending(self):
+        url = '/api/recipes/trending/'
+        self.assertEqual(self.client.get(url).data['count'], 0)
+        # Избранное без сигналов: счетчики расходятся до rollup_counters.
+        Favorite.objects.bulk_create([Favorite(
+            user=self.author, recipe=self.recipe
+        )])
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rollup_counters', stdout=StringIO())
+        self.assertEqual(self.client.get(url).data['count'], 1)
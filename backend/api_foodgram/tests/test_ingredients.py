@@ -0,0 +1,67 @@
+import json
+from io import StringIO
+from tempfile import NamedTemporaryFile
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from ingredients.models import Ingredient
+from recipes.management.commands.load_ingredients import Command
+
+URL = '/api/ingredients/'
+
+
+class IngredientIndexTest(TestCase):
+    """Индекс в памяти видит ингредиенты, загруженные командой."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def search(self, name):
+        return [
+            ingredient['name']
+            for ingredient in self.client.get(URL, {'name': name}).data
+        ]
+
+    def test_load_ingredients(self):
+        self.assertEqual(self.search('с'), ['соль'])
+        with NamedTemporaryFile('w', suffix='.json') as file:
+            json.dump([{'name': 'сахар', 'measurement_unit': 'г'}], file)
+            file.flush()
+            # Команда работает в своем процессе: индексу web-процесса
+            # достается только новая версия в БД.
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('load_ingredients', file.name, stdout=StringIO())
+        self.assertEqual(self.search('с'), ['соль', 'сахар'])
+
+    def test_one_version_query(self):
+        self.search('с')
+        with self.assertNumQueries(1):
+            self.search('со')
+
+
+class LoadIngredientsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+
+    def test_conflicts_are_not_counted(self):
+        stdout = StringIO()
+        # Другой процесс вставил соль между проверкой и вставкой.
+        with NamedTemporaryFile('w', suffix='.json') as file, \
+                mock.patch.object(Command, 'get_existing', return_value=set()):
+            json.dump([
+                {'name': 'соль', 'measurement_unit': 'г'},
+                {'name': 'сахар', 'measurement_unit': 'г'},
+            ], file)
+            file.flush()
+            call_command('load_ingredients', file.name, stdout=stdout)
+        self.assertIn('Добавлено: 1, без изменений: 1', stdout.getvalue())
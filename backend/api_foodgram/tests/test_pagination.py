@@ -0,0 +1,146 @@
+import json
+from base64 import urlsafe_b64encode
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from backend.admin import EstimatedCountPaginator
+from recipes.models import Recipe
+from users.models import Subscription
+
+User = get_user_model()
+
+
+def encode_cursor(values, reverse=False):
+    return urlsafe_b64encode(
+        json.dumps({'v': values, 'r': reverse}).encode()
+    ).decode()
+
+
+class KeysetPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password', first_name='Имя', last_name='Фамилия'
+        )
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            password='password', first_name='Имя', last_name='Фамилия'
+        )
+        for number in range(7):
+            Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}', text='Описание',
+                cooking_time=5, image='recipes/images/test.jpg'
+            )
+        Subscription.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_walks_all_pages(self):
+        expected = list(Recipe.objects.values_list('id', flat=True))
+        self.assertEqual(
+            self.walk('/api/recipes/?pagination=cursor&limit=3'), expected
+        )
+        self.assertEqual(self.walk('/api/recipes/feed/?limit=3'), expected)
+
+    def test_search_with_ordering(self):
+        response = self.client.get(
+            '/api/recipes/', {'search': 'рецепт', 'ordering': 'popular'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_cursor(self):
+        cursors = (
+            'garbage',
+            encode_cursor(['2020-01-01T00:00:00+00:00', 'x']),
+            encode_cursor(['not a date', 1]),
+            encode_cursor(['2020-01-01T00:00:00+00:00']),
+            encode_cursor([True, 1]),
+        )
+        for url in ('/api/recipes/', '/api/recipes/feed/'):
+            for cursor in cursors:
+                with self.subTest(url=url, cursor=cursor):
+                    response = self.client.get(url, {'cursor': cursor})
+                    self.assertEqual(response.status_code, 404)
+
+
+class CachedCountTest(TestCase):
+    """Закэшированное количество меняется вместе с данными."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password', first_name='Имя', last_name='Фамилия'
+        )
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            password='password', first_name='Имя', last_name='Фамилия'
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}', text='Описание',
+                cooking_time=5, image='recipes/images/test.jpg'
+            )
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def assert_count(self, url, count):
+        response = self.client.get(url)
+        self.assertEqual(response.data['count'], count)
+        self.assertEqual(len(response.data['results']), count)
+
+    def test_favorites(self):
+        url = '/api/recipes/?is_favorited=1'
+        for recipe in self.recipes:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f'/api/recipes/{recipe.id}/favorite/')
+        self.assert_count(url, 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/recipes/{self.recipes[0].id}/favorite/')
+        self.assert_count(url, 2)
+
+    def test_subscriptions(self):
+        url = '/api/users/subscriptions/'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        self.assert_count(url, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/users/{self.author.id}/subscribe/')
+        self.assert_count(url, 0)
+
+    def test_new_recipe(self):
+        self.assert_count('/api/recipes/', 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.create(
+                author=self.author, name='Новый', text='Описание',
+                cooking_time=5, image='recipes/images/test.jpg'
+            )
+        self.assert_count('/api/recipes/', 4)
+
+    def test_admin_count_is_cached(self):
+        EstimatedCountPaginator(Recipe.objects.all(), 20).count
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                EstimatedCountPaginator(Recipe.objects.all(), 20).count, 3
+            )
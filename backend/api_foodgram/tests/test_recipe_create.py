@@ -0,0 +1,193 @@
+import base64
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from ingredients.models import Ingredient
+from recipes import images
+from recipes.models import Recipe
+from tags.models import Tag
+
+User = get_user_model()
+
+URL = '/api/recipes/'
+
+
+def get_png(size):
+    """PNG из шума: больше BASE64_CHUNK_SIZE уже при 200x200."""
+    buffer = BytesIO()
+    Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3)).save(
+        buffer, 'PNG'
+    )
+    return buffer.getvalue()
+
+
+class RecipeFixtureMixin:
+    @classmethod
+    def create_objects(cls):
+        cls.user = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password', first_name='Имя', last_name='Фамилия'
+        )
+        cls.tag = Tag.objects.create(name='Тег', color='#FFFFFF', slug='tag')
+        cls.other_tag = Tag.objects.create(
+            name='Другой тег', color='#000000', slug='other'
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='Ингредиент', measurement_unit='г'
+        )
+        cls.other_ingredient = Ingredient.objects.create(
+            name='Другой ингредиент', measurement_unit='шт'
+        )
+
+    def set_up_client(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_data(self, **data):
+        return {
+            'tags': [self.tag.id],
+            'ingredients': [{'id': self.ingredient.id, 'amount': 10}],
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 5,
+            **data
+        }
+
+
+class RecipeCreateTest(RecipeFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_objects()
+
+    def setUp(self):
+        self.set_up_client()
+
+    def test_multipart_keeps_plain_fields_as_strings(self):
+        image = BytesIO(get_png((10, 10)))
+        image.name = 'image.png'
+        data = self.get_data(name='[1,2]', text='{"a": 1}', image=image)
+        data['tags'] = json.dumps(data['tags'])
+        data['ingredients'] = json.dumps(data['ingredients'])
+        response = self.client.post(URL, data, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        recipe = Recipe.objects.get(id=response.data['id'])
+        self.assertEqual(recipe.name, '[1,2]')
+        self.assertEqual(recipe.text, '{"a": 1}')
+        self.assertEqual(list(recipe.tags.all()), [self.tag])
+
+    def test_line_wrapped_base64(self):
+        for size in ((10, 10), (200, 200)):
+            with self.subTest(size=size):
+                content = get_png(size)
+                encoded = base64.encodebytes(content).decode()
+                response = self.client.post(URL, self.get_data(
+                    image=f'data:image/png;base64,{encoded}'
+                ), format='json')
+                self.assertEqual(response.status_code, 201, response.data)
+                recipe = Recipe.objects.get(id=response.data['id'])
+                with recipe.image.open() as file:
+                    self.assertEqual(file.read(), content)
+
+    def test_invalid_base64(self):
+        encoded = base64.b64encode(get_png((10, 10))).decode()
+        for image in (encoded[:-1], encoded + '!', ' \n'):
+            with self.subTest(image=image[-5:]):
+                response = self.client.post(URL, self.get_data(
+                    image=f'data:image/png;base64,{image}'
+                ), format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('image', response.data)
+
+    @mock.patch.object(images, 'close_old_connections', mock.Mock())
+    def test_derivative_errors_are_logged(self):
+        with self.assertLogs('recipes.images', 'ERROR'):
+            images.update_image_derivatives(0, 'recipes/images/missing.png')
+
+
+class NoopExecutor:
+    def submit(self, function, *args):
+        pass
+
+
+@mock.patch.object(images, 'executor', NoopExecutor())
+class RecipeResponseTest(RecipeFixtureMixin, TransactionTestCase):
+    """
+    Ответы создания и изменения совпадают с сохраненным рецептом.
+    Версии кэша меняются после фиксации транзакции, поэтому нужен
+    TransactionTestCase.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.create_objects()
+        self.set_up_client()
+
+    def assert_matches_stored(self, response, url):
+        # Без кэша GET строит представление заново из базы.
+        cache.clear()
+        self.assertEqual(response.data, self.client.get(url).data)
+
+    def write(self, method, url, data):
+        """Запрос и выборки тегов и строк ингредиентов рецепта."""
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data, format='json')
+        reads = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith((
+                'SELECT ("recipes_recipe_tags"."recipe_id")',
+                'SELECT "recipes_ingredientsinrecipe"."id"',
+            ))
+        ]
+        return response, reads
+
+    def test_responses_match_stored_recipe(self):
+        image = base64.b64encode(get_png((10, 10))).decode()
+        response, reads = self.write('post', URL, self.get_data(
+            tags=[self.other_tag.id, self.tag.id],
+            image=f'data:image/png;base64,{image}'
+        ))
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(reads, [])
+        url = f'{URL}{response.data["id"]}/'
+        self.assert_matches_stored(response, url)
+        response, reads = self.write('patch', url, self.get_data(
+            tags=[self.other_tag.id],
+            ingredients=[
+                {'id': self.other_ingredient.id, 'amount': 1},
+                {'id': self.ingredient.id, 'amount': 20},
+            ]
+        ))
+        self.assertEqual(response.status_code, 200, response.data)
+        # Текущие строки ингредиентов читаются один раз для сравнения.
+        self.assertEqual(len(reads), 1)
+        self.assertEqual(
+            [tag['id'] for tag in response.data['tags']], [self.other_tag.id]
+        )
+        self.assertEqual(
+            {
+                (ingredient['id'], ingredient['amount'])
+                for ingredient in response.data['ingredients']
+            },
+            {(self.ingredient.id, 20), (self.other_ingredient.id, 1)}
+        )
+        self.assert_matches_stored(response, url)
+        response = self.client.patch(url, {'name': 'Новое'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assert_matches_stored(response, url)
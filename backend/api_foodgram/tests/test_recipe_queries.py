@@ -0,0 +1,103 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api_foodgram.versions import get_versions
+from ingredients.models import Ingredient
+from recipes.models import IngredientsinRecipe, Recipe
+from tags.models import Tag
+
+User = get_user_model()
+
+# Пустой кэш: версии для ETag, COUNT, рецепты, версии рецептов страницы,
+# авторы, теги, ингредиенты.
+LIST_QUERIES = 7
+# Версии, рецепт, автор, теги, ингредиенты.
+RETRIEVE_QUERIES = 5
+# Множества избранного, корзины и подписок пользователя.
+RELATIONS_QUERIES = 3
+# Заполненный кэш: версии для ETag, рецепты, версии рецептов страницы.
+CACHED_LIST_QUERIES = 3
+# Версии и рецепт.
+CACHED_RETRIEVE_QUERIES = 2
+
+
+class RecipeQueryCountTest(TestCase):
+    """Количество запросов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password', first_name='Имя', last_name='Фамилия'
+        )
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', color='#FFFFFF', slug=f'tag{number}'
+            )
+            for number in range(3)
+        ]
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(10)
+        )
+        ingredients = list(Ingredient.objects.all())
+        for number in range(60):
+            recipe = Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {number}', text='Описание',
+                cooking_time=5, image='recipes/images/test.jpg'
+            )
+            recipe.tags.set(tags[:number % 3 + 1])
+            IngredientsinRecipe.objects.bulk_create(
+                IngredientsinRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=1
+                )
+                for ingredient in ingredients[:number % 5 + 1]
+            )
+        cls.recipe = Recipe.objects.first()
+        # Строки версий уже созданы, как в работающем проекте.
+        get_versions('recipes', 'tags', 'ingredients', *(
+            f'recipe:{recipe_id}'
+            for recipe_id in Recipe.objects.values_list('id', flat=True)
+        ))
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.authenticated = APIClient()
+        self.authenticated.force_authenticate(self.user)
+
+    def assert_queries(self, client, url, cold, warm):
+        cache.clear()
+        with self.assertNumQueries(cold):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(warm):
+            client.get(url)
+
+    def test_list(self):
+        for limit in (6, 50):
+            with self.subTest(limit=limit):
+                url = f'/api/recipes/?limit={limit}'
+                self.assert_queries(
+                    self.anonymous, url, LIST_QUERIES, CACHED_LIST_QUERIES
+                )
+                self.assert_queries(
+                    self.authenticated, url,
+                    LIST_QUERIES + RELATIONS_QUERIES, CACHED_LIST_QUERIES
+                )
+
+    def test_retrieve(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.assert_queries(
+            self.anonymous, url, RETRIEVE_QUERIES, CACHED_RETRIEVE_QUERIES
+        )
+        self.assert_queries(
+            self.authenticated, url,
+            RETRIEVE_QUERIES + RELATIONS_QUERIES, CACHED_RETRIEVE_QUERIES
+        )
+
+    def test_page_size(self):
+        response = self.anonymous.get('/api/recipes/?limit=50')
+        self.assertEqual(len(response.data['results']), 50)
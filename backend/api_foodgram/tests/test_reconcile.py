@@ -0,0 +1,71 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from ingredients.models import Ingredient
+from recipes.feed import get_expected_feeds, get_stored_feeds
+from recipes.models import (FeedItem, IngredientsinRecipe, Recipe,
+                            ShoppingCart, ShoppingListItem)
+from recipes.shopping_list import (get_expected_shopping_lists,
+                                   get_stored_shopping_lists)
+from users.models import Subscription
+
+User = get_user_model()
+
+
+class ReconcileTest(TestCase):
+    """Команды сверки исправляют ленты и списки покупок порциями."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                username=f'user{number}', email=f'user{number}@example.com',
+                password='password', first_name='Имя', last_name='Фамилия'
+            )
+            for number in range(3)
+        ]
+        author = cls.users[0]
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        recipes = [
+            Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Описание',
+                cooking_time=5, image='recipes/images/test.jpg'
+            )
+            for number in range(2)
+        ]
+        for recipe in recipes:
+            IngredientsinRecipe.objects.create(
+                recipe=recipe, ingredient=salt, amount=10
+            )
+        for user in cls.users[1:]:
+            Subscription.objects.create(user=user, author=author)
+            ShoppingCart.objects.create(user=user, recipe=recipes[0])
+        # Расхождения: пропавшая и лишняя строки, неверное количество.
+        FeedItem.objects.filter(user=cls.users[1]).first().delete()
+        FeedItem.objects.create(
+            user=cls.users[0], recipe=recipes[0], author=author,
+            pub_date=recipes[0].pub_date
+        )
+        ShoppingListItem.objects.filter(user=cls.users[2]).update(amount=1)
+
+    def call(self, name, *args):
+        call_command(name, '--users-per-batch=1', *args, stdout=StringIO())
+
+    def test_feeds(self):
+        with self.assertRaises(CommandError):
+            self.call('rebuild_feeds', '--check')
+        self.call('rebuild_feeds')
+        self.assertEqual(get_stored_feeds(), get_expected_feeds())
+        self.call('rebuild_feeds', '--check')
+
+    def test_shopping_lists(self):
+        with self.assertRaises(CommandError):
+            self.call('rebuild_shopping_lists', '--check')
+        self.call('rebuild_shopping_lists')
+        self.assertEqual(
+            get_stored_shopping_lists(), get_expected_shopping_lists()
+        )
+        self.call('rebuild_shopping_lists', '--check')
@@ -0,0 +1,155 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from api_foodgram.relations import UserRelations
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription
+
+User = get_user_model()
+
+THREADS = 8
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com',
+        password='password', first_name='Имя', last_name='Фамилия'
+    )
+
+
+class ConcurrentToggleTest(TransactionTestCase):
+    """Одновременные одинаковые запросы создают одну связь."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('user')
+        self.author = create_user('author')
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            cooking_time=5, image='recipes/images/test.jpg'
+        )
+
+    def post_concurrently(self, url):
+        barrier = Barrier(THREADS)
+
+        def post():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                barrier.wait()
+                return client.post(url).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=THREADS) as executor:
+            futures = [executor.submit(post) for _ in range(THREADS)]
+            return sorted(future.result() for future in futures)
+
+    def assert_single_created(self, statuses):
+        self.assertEqual(statuses, [201] + [400] * (THREADS - 1))
+
+    def test_favorite(self):
+        self.assert_single_created(self.post_concurrently(
+            f'/api/recipes/{self.recipe.id}/favorite/'
+        ))
+        self.assertEqual(Favorite.objects.count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_shopping_cart(self):
+        self.assert_single_created(self.post_concurrently(
+            f'/api/recipes/{self.recipe.id}/shopping_cart/'
+        ))
+        self.assertEqual(ShoppingCart.objects.count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.carts_count, 1)
+
+    def test_subscribe(self):
+        self.assert_single_created(self.post_concurrently(
+            f'/api/users/{self.author.id}/subscribe/'
+        ))
+        self.assertEqual(Subscription.objects.count(), 1)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+
+
+class RelationSignalTest(TestCase):
+    """Обработчики сигналов получают объект связи с id."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', text='Описание',
+            cooking_time=5, image='recipes/images/test.jpg'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.instances = []
+        for signal in (post_save, post_delete):
+            signal.connect(self.receive, sender=Favorite)
+            self.addCleanup(signal.disconnect, self.receive, sender=Favorite)
+
+    def receive(self, instance, **kwargs):
+        self.instances.append(instance)
+
+    def test_instance_has_pk(self):
+        url = f'/api/recipes/{self.recipe.id}/favorite/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        favorite = Favorite.objects.get()
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(
+            [instance.pk for instance in self.instances],
+            [favorite.pk, favorite.pk]
+        )
+
+    def test_batch_instances_have_pk(self):
+        url = '/api/recipes/favorite/'
+        data = {'ids': [self.recipe.id]}
+        self.assertEqual(
+            self.client.post(url, data, format='json').status_code, 200
+        )
+        favorite = Favorite.objects.get()
+        self.client.delete(url, data, format='json')
+        self.assertEqual(
+            [instance.pk for instance in self.instances],
+            [favorite.pk, favorite.pk]
+        )
+
+
+class RelationVersionTest(TestCase):
+    """ETag с флагами пользователя зависит от связей, а не от кэша."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', text='Описание',
+            cooking_time=5, image='recipes/images/test.jpg'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_etag(self):
+        return self.client.get('/api/recipes/')['ETag']
+
+    def test_etag(self):
+        etag = self.get_etag()
+        UserRelations.invalidate(self.user.id)
+        self.assertEqual(self.get_etag(), etag)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.assertNotEqual(self.get_etag(), etag)
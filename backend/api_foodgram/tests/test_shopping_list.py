@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api_foodgram import shopping_list
+from ingredients.models import Ingredient
+from recipes.models import ShoppingListItem
+
+User = get_user_model()
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+class InlineExecutor:
+    def submit(self, function, *args):
+        function(*args)
+
+
+class ShoppingListPdfTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password',
+            first_name='Имя', last_name='Фамилия'
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(shopping_list.SYNC_RENDER_LIMIT + 1)
+        )
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(user=cls.user, ingredient=ingredient, amount=1)
+            for ingredient in Ingredient.objects.all()
+        )
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_large_list_is_downloaded_by_default(self):
+        response = self.client.get(URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    @mock.patch.object(shopping_list, 'executor', InlineExecutor())
+    def test_background_render_is_opt_in(self):
+        response = self.client.get(URL, {'async': 'true'})
+        self.assertEqual(response.status_code, 202)
+        response = self.client.get(response['Location'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    def test_expired_files_are_deleted(self):
+        expired = default_storage.save(
+            f'{shopping_list.PDF_DIRECTORY}/expired.pdf', ContentFile(b'')
+        )
+        timestamp = time.time() - shopping_list.PDF_TIMEOUT - 60
+        os.utime(default_storage.path(expired), (timestamp, timestamp))
+        fresh = default_storage.save(
+            f'{shopping_list.PDF_DIRECTORY}/fresh.pdf', ContentFile(b'')
+        )
+        self.assertEqual(self.client.get(URL).status_code, 200)
+        self.assertFalse(default_storage.exists(expired))
+        self.assertTrue(default_storage.exists(fresh))
+
+    @mock.patch.object(shopping_list, 'executor', InlineExecutor())
+    def test_failed_render_is_reported(self):
+        with mock.patch.object(
+            shopping_list, 'get_pdf', side_effect=OSError('нет шрифта')
+        ), self.assertLogs('api_foodgram.shopping_list', 'ERROR'):
+            response = self.client.get(URL, {'async': 'true'})
+        self.assertEqual(response.status_code, 202)
+        location = response['Location']
+        self.assertEqual(self.client.get(location).status_code, 500)
+        # Повторный запрос списка запускает рендеринг заново.
+        response = self.client.get(URL, {'async': 'true'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.client.get(location).status_code, 200)
+
+    @mock.patch.object(shopping_list, 'executor', InlineExecutor())
+    def test_other_user_cannot_download(self):
+        location = self.client.get(URL, {'async': 'true'})['Location']
+        other = User.objects.create_user(
+            username='other', email='other@example.com', password='password',
+            first_name='Имя', last_name='Фамилия'
+        )
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(location).status_code, 404)
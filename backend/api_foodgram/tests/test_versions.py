@@ -0,0 +1,54 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from rest_framework.test import APIClient
+
+from api_foodgram.versions import get_versions, write_versions
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class VersionTest(TestCase):
+    """Версии хранятся в БД и общие для всех процессов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password', first_name='Имя', last_name='Фамилия'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def create_recipe(self, name):
+        return Recipe.objects.bulk_create([Recipe(
+            author=self.author, name=name, text='Описание',
+            cooking_time=5, image='recipes/images/test.jpg'
+        )])
+
+    def test_bump_from_another_process(self):
+        self.create_recipe('Первый')
+        response = self.client.get('/api/recipes/')
+        etag = response['ETag']
+        # Management-команда меняет только строку версии в БД,
+        # кэш этого процесса она не видит.
+        self.create_recipe('Второй')
+        write_versions(['recipes'])
+        response = self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_read_once_per_request(self):
+        get_versions('ingredients')
+        request = RequestFactory().get('/')
+        versions = get_versions('recipes', 'tags', request=request)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                get_versions('tags', 'recipes', request=request),
+                versions
+            )
+        with self.assertNumQueries(1):
+            get_versions('recipes', 'ingredients', request=request)
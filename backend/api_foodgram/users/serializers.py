@@ -1,9 +1,12 @@
 from django.contrib.auth import get_user_model
+from django.db.models import F, Manager, Window
+from django.db.models.functions import RowNumber
 from djoser.conf import settings
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 
-from api_foodgram.recipes.serializers import RecipeInFavoriteOrCartSerializer
+from api_foodgram.relations import get_relations
+from recipes.models import Recipe
 from users.models import Subscription
 
 User = get_user_model()
@@ -21,13 +24,9 @@ class UserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        return (
-            not self.context.get('request').user.is_anonymous
-            and Subscription.objects.filter(
-                user=self.context.get('request').user,
-                author=obj
-            ).exists()
-        )
+        return obj.id in get_relations(
+            self.context.get('request')
+        ).subscriptions
 
 
 class UserCreateSerializer(UserCreateSerializer):
@@ -46,10 +45,67 @@ class UserCreateSerializer(UserCreateSerializer):
         return super().validate(attrs)
 
 
+def get_recipes_limit(request):
+    """Значение recipes_limit из запроса: None без ограничения."""
+    limit = request.query_params.get('recipes_limit') if request else None
+    if limit in (None, ''):
+        return None
+    if not limit.isdigit():
+        raise serializers.ValidationError({
+            'recipes_limit': ['Введите целое неотрицательное число']
+        })
+    return int(limit)
+
+
+def get_latest_recipes(author_ids, limit=None):
+    """
+    Последние рецепты авторов одним запросом, не больше limit на автора.
+
+    Django 3.2 не умеет фильтровать по оконным функциям, поэтому запрос
+    с ROW_NUMBER() строится ORM и оборачивается в SQL с условием на номер.
+    """
+    recipes = Recipe.objects.filter(author_id__in=author_ids)
+    if limit is None:
+        return list(recipes.order_by('author_id', '-pub_date', '-id'))
+    sql, params = recipes.annotate(
+        row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=[F('pub_date').desc(), F('id').desc()]
+        )
+    ).order_by().query.sql_with_params()
+    return list(Recipe.objects.raw(
+        f'SELECT * FROM ({sql}) ranked WHERE row_number <= %s '
+        f'ORDER BY author_id, pub_date DESC, id DESC',
+        (*params, limit)
+    ))
+
+
+class SubscriptionsListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        authors = list(data.all() if isinstance(data, Manager) else data)
+        recipes = {author.id: [] for author in authors}
+        for recipe in get_latest_recipes(
+            recipes, get_recipes_limit(self.context.get('request'))
+        ):
+            recipes[recipe.author_id].append(recipe)
+        for author in authors:
+            author.latest_recipes = recipes[author.id]
+        return super().to_representation(authors)
+
+
 class SubscriptionsSerializer(UserSerializer):
+    """
+    Автор в подписках с последними рецептами.
+
+    recipes_count - счетчик в модели, а рецепты всей страницы
+    загружает SubscriptionsListSerializer одним запросом; для одиночного
+    автора они запрашиваются отдельно.
+    """
+
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -63,20 +119,21 @@ class SubscriptionsSerializer(UserSerializer):
             'recipes',
             'recipes_count'
         )
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        list_serializer_class = SubscriptionsListSerializer
 
     def get_recipes(self, obj):
-        limit = self.context.get('request').query_params.get('recipes_limit')
-        if limit:
-            return RecipeInFavoriteOrCartSerializer(
-                obj.recipes.all()[: int(limit)],
-                many=True,
-                context={'request': self.context.get('request')}
-            ).data
+        # Импорт внутри метода разрывает циклический импорт: сериализатор
+        # рецептов вкладывает UserSerializer из этого модуля.
+        from api_foodgram.recipes.serializers import (
+            RecipeInFavoriteOrCartSerializer
+        )
+        recipes = getattr(obj, 'latest_recipes', None)
+        if recipes is None:
+            recipes = get_latest_recipes(
+                [obj.id], get_recipes_limit(self.context.get('request'))
+            )
         return RecipeInFavoriteOrCartSerializer(
-            obj.recipes.all(),
+            recipes,
             many=True,
             context={'request': self.context.get('request')}
         ).data
@@ -87,28 +144,6 @@ class SubscriptionCreateSerializer(serializers.ModelSerializer):
         model = Subscription
         fields = ('user', 'author')
 
-    def validate(self, attrs):
-        if self.context.get('request').method == 'POST':
-            if attrs['user'] == attrs['author']:
-                raise serializers.ValidationError(
-                    'Вы не можете подписаться сами на себя'
-                )
-            if Subscription.objects.filter(
-                user=attrs['user'], author=attrs['author']
-            ).exists():
-                raise serializers.ValidationError(
-                    'Вы уже подписаны на этого пользователя'
-                )
-            return attrs
-        if self.context.get('request').method == 'DELETE':
-            if not Subscription.objects.filter(
-                user=attrs['user'], author=attrs['author']
-            ).exists():
-                raise serializers.ValidationError(
-                    'Вы не подписаны на этого пользователя'
-                )
-            return attrs
-
     def to_representation(self, instance):
         return SubscriptionsSerializer(
             instance.author,
@@ -4,19 +4,26 @@ from djoser import views
 from djoser.conf import settings
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
+from api_foodgram.mixins import BatchRelationMixin
 from api_foodgram.pagination import UserRecipePagination
+from api_foodgram.relations import add_relation, remove_relation
 from api_foodgram.users.serializers import (SubscriptionCreateSerializer,
-                                            SubscriptionsSerializer)
+                                            SubscriptionsSerializer,
+                                            get_recipes_limit)
 from users.models import Subscription
 
 User = get_user_model()
 
 
-class UserViewSet(views.UserViewSet):
+class UserViewSet(BatchRelationMixin, views.UserViewSet):
     pagination_class = UserRecipePagination
+    cursor_ordering = ('id', )
+    lookup_value_regex = r'\d+'
 
     def get_permissions(self):
         # retrieve должен быть доступен всем, при изменении перимишена
@@ -26,7 +33,7 @@ class UserViewSet(views.UserViewSet):
         return super().get_permissions()
 
     def get_queryset(self):
-        return User.objects.all()
+        return User.objects.order_by('id')
 
     @action(
         methods=['get'],
@@ -34,7 +41,10 @@ class UserViewSet(views.UserViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def subscriptions(self, request):
-        queryset = User.objects.filter(subscription__user=request.user)
+        get_recipes_limit(request)
+        queryset = User.objects.filter(
+            subscription__user=request.user
+        ).order_by('id')
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = SubscriptionsSerializer(
@@ -51,14 +61,22 @@ class UserViewSet(views.UserViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def subscribe(self, request, id):
-        user = request.user
+        get_recipes_limit(request)
         author = get_object_or_404(User, pk=id)
+        if author == request.user:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                'Вы не можете подписаться сами на себя'
+            ]})
+        subscription = add_relation(
+            Subscription, user=request.user, author=author
+        )
+        if subscription is None:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                'Вы уже подписаны на этого пользователя'
+            ]})
         serializer = SubscriptionCreateSerializer(
-            data={'user': user.id, 'author': author.id},
-            context={'request': request}
+            subscription, context={'request': request}
         )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
         return Response(
             serializer.data,
             status=status.HTTP_201_CREATED
@@ -66,15 +84,31 @@ class UserViewSet(views.UserViewSet):
 
     @subscribe.mapping.delete
     def delete_subscribe(self, request, id):
-        user = request.user
-        author = get_object_or_404(User, pk=id)
-        serializer = SubscriptionCreateSerializer(
-            data={'user': user.id, 'author': author.id},
-            context={'request': request}
-        )
-        serializer.is_valid(raise_exception=True)
-        Subscription.objects.filter(
-            user=user, author=author).delete()
+        if not remove_relation(Subscription, user=request.user, author=id):
+            get_object_or_404(User, pk=id)
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                'Вы не подписаны на этого пользователя'
+            ]})
         return Response(
             status=status.HTTP_204_NO_CONTENT
         )
+
+    @action(
+        methods=['post', 'delete'],
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        url_path='subscribe',
+        url_name='subscribe-batch'
+    )
+    def subscribe_batch(self, request):
+        return self.update_relations(
+            request, Subscription, 'author', User.objects.all(), {
+                'exists': 'Вы уже подписаны на этого пользователя',
+                'missing': 'Вы не подписаны на этого пользователя',
+                'not_found': 'Пользователь не найден',
+                'forbidden': 'Вы не можете подписаться сами на себя',
+            },
+            forbidden=(
+                {request.user.id} if request.method == 'POST' else ()
+            )
+        )
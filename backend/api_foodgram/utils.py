@@ -1,19 +1,31 @@
 import io
+from functools import lru_cache
 
+from django.conf import settings
 from reportlab.lib.units import inch
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
+FONT_NAME = 'Arial'
+
+
+@lru_cache(maxsize=None)
+def register_fonts():
+    """Разбирает TTF-шрифт один раз за время жизни процесса."""
+    pdfmetrics.registerFont(
+        TTFont(FONT_NAME, str(settings.BASE_DIR / 'fonts' / 'arialmt.ttf'))
+    )
+
 
 def get_pdf(ingredients):
+    register_fonts()
     buf = io.BytesIO()
     p = canvas.Canvas(buf)
-    pdfmetrics.registerFont(TTFont('Arial', 'arialmt.ttf'))
     p.setFillColorRGB(0, 0, 1)
     p.rect(150, 780, 300, 30, fill=True)
     p.setFillColorRGB(255, 255, 255)
-    p.setFont('Arial', 20)
+    p.setFont(FONT_NAME, 20)
     p.drawString(253, 787, 'FoodGram')
     p.setFillColorRGB(0, 0, 0)
     y = 0
@@ -27,7 +39,7 @@ def get_pdf(ingredients):
         p.drawString(inch * 2 + 6, inch * 10 + 15 - y, string)
         if count % 36 == 0:
             p.showPage()
-            p.setFont('Arial', 20)
+            p.setFont(FONT_NAME, 20)
             y = -50
         count += 1
         y += 20
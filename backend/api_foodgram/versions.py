@@ -0,0 +1,66 @@
+from uuid import uuid4
+
+from django.db import connection, transaction
+
+from api_foodgram.models import Version
+
+# Ограничение на число параметров одного запроса в SQLite.
+BUMP_CHUNK_SIZE = 400
+
+
+def get_versions(*names, request=None):
+    """
+    Возвращает текущие версии по именам в виде словаря.
+
+    Версии хранятся в БД, поэтому изменения из management-команд
+    и других воркеров видны сразу, какой бы ни был бэкенд кэша.
+    Версия - случайный токен, а не счетчик: для имени без строки
+    создается новый токен, и записи кэша, оставшиеся от прежней базы,
+    гарантированно перестают совпадать. С request версии читаются
+    один раз за запрос.
+    """
+    known = getattr(request, '_versions', None)
+    if known is None:
+        known = {}
+        if request is not None:
+            request._versions = known
+    missing = [name for name in dict.fromkeys(names) if name not in known]
+    if missing:
+        versions = dict(Version.objects.filter(
+            name__in=missing
+        ).values_list('name', 'value'))
+        absent = [name for name in missing if name not in versions]
+        if absent:
+            Version.objects.bulk_create(
+                [Version(name=name, value=uuid4().hex) for name in absent],
+                ignore_conflicts=True
+            )
+            versions.update(Version.objects.filter(
+                name__in=absent
+            ).values_list('name', 'value'))
+        known.update(versions)
+    return {name: known[name] for name in names}
+
+
+def bump_versions(*names):
+    """Меняет версии после фиксации текущей транзакции."""
+    transaction.on_commit(lambda: write_versions(sorted(set(names))))
+
+
+def write_versions(names):
+    table = Version._meta.db_table
+    name = Version._meta.get_field('name').column
+    value = Version._meta.get_field('value').column
+    with connection.cursor() as cursor:
+        for start in range(0, len(names), BUMP_CHUNK_SIZE):
+            chunk = names[start:start + BUMP_CHUNK_SIZE]
+            cursor.execute(
+                f'INSERT INTO {table} ({name}, {value}) '
+                f'VALUES {", ".join(["(%s, %s)"] * len(chunk))} '
+                f'ON CONFLICT ({name}) '
+                f'DO UPDATE SET {value} = excluded.{value}',
+                [
+                    param for version_name in chunk
+                    for param in (version_name, uuid4().hex)
+                ]
+            )
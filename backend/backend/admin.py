@@ -0,0 +1,122 @@
+"""
+Общие части админки для таблиц с сотнями тысяч строк.
+
+Стандартные фильтры по связанным объектам выводят в боковую панель все
+значения, а пагинатор считает строки COUNT(*) на каждой странице.
+Здесь фильтры с полем ввода и пагинатор с оценкой количества строк.
+"""
+
+from django.contrib import admin
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from api_foodgram.pagination import CachedCountPaginator
+
+# Меньше этого количества строк выгоднее посчитать точно.
+ESTIMATE_THRESHOLD = 100_000
+
+
+class EstimatedCountPaginator(CachedCountPaginator):
+    """
+    Для запроса без фильтров на PostgreSQL берет оценку количества
+    строк из статистики таблицы, остальные запросы считает
+    CachedCountPaginator.
+    """
+
+    # Версий данных у админки нет, количество может отставать
+    # на count_timeout секунд.
+    version = ''
+
+    @cached_property
+    def count(self):
+        estimate = self.get_estimate()
+        if estimate is None:
+            return super().count
+        return estimate
+
+    def get_estimate(self):
+        query = getattr(self.object_list, 'query', None)
+        if (
+            connection.vendor != 'postgresql'
+            or query is None
+            or query.where
+            or query.distinct
+        ):
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [query.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < ESTIMATE_THRESHOLD:
+            return None
+        return row[0]
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 20
+
+
+class InputFilter(admin.SimpleListFilter):
+    """
+    Фильтр по связанному объекту с полем ввода вместо списка значений.
+
+    Число ищется по id, строка - по полям lookups связанного объекта.
+    """
+
+    template = 'admin/input_filter.html'
+    field_name = None
+    lookups_fields = ()
+    placeholder = 'id'
+
+    def __init__(self, request, params, model, model_admin):
+        if self.parameter_name is None:
+            self.parameter_name = self.field_name
+        super().__init__(request, params, model, model_admin)
+
+    def lookups(self, request, model_admin):
+        # Без вариантов SimpleListFilter не выводится.
+        return ((None, None), )
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        all_choice['query_parts'] = [
+            (name, value)
+            for name, value in changelist.params.items()
+            if name != self.parameter_name
+        ]
+        yield all_choice
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return queryset
+        if value.isdigit():
+            return queryset.filter(**{f'{self.field_name}_id': value})
+        condition = Q()
+        for lookup in self.lookups_fields:
+            condition |= Q(**{f'{self.field_name}__{lookup}': value})
+        return queryset.filter(condition)
+
+
+class UserInputFilter(InputFilter):
+    title = 'пользователю'
+    field_name = 'user'
+    lookups_fields = ('email__iexact', 'username__iexact')
+    placeholder = 'id, email или имя пользователя'
+
+
+class AuthorInputFilter(UserInputFilter):
+    title = 'автору'
+    field_name = 'author'
+
+
+class RecipeInputFilter(InputFilter):
+    title = 'рецепту'
+    field_name = 'recipe'
+    lookups_fields = ('name__icontains', )
+    placeholder = 'id или название'
@@ -3,3 +3,6 @@ MAX_LENGTH_TAG = 200
 MAX_LENGTH_TAG_COLOR = 7
 MAX_LENGTH_RECIPE = 200
 MAX_LENGTH_INGREDIENT = 200
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+MAX_IMAGE_PIXELS = 40_000_000
+MAX_BATCH_SIZE = 100
@@ -0,0 +1,29 @@
+class CounterFieldsMixin:
+    """
+    Модель с денормализованными счетчиками.
+
+    Счетчики меняются только запросами UPDATE ... SET n = n + 1
+    (recipes.popularity). Полное сохранение записало бы поверх
+    параллельных изменений значения, прочитанные вместе с объектом,
+    поэтому save() существующей строки пишет все поля, кроме
+    counter_fields. Явный update_fields не меняется.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not args
+            and not self._state.adding
+            and self.pk is not None
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
@@ -64,7 +64,7 @@ ROOT_URLCONF = 'backend.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -90,6 +90,29 @@ DATABASES = {
     }
 }
 
+if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+    # Тестовая база SQLite в памяти при одновременной записи из потоков
+    # сразу выдает "table is locked", файловая - ждет блокировку.
+    DATABASES['default']['TEST'] = {'NAME': BASE_DIR / 'test_db.sqlite3'}
+
+if any(
+    name in DATABASES['default']['ENGINE'] for name in ('postgresql', 'postgis')
+):
+    # Лукап trigram_similar для нечеткого поиска ингредиентов.
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+# Версии кэшированных данных хранятся в БД (api_foodgram.versions), так что
+# с LocMemCache ответы не устаревают, но каждый воркер заполняет свой кэш.
+# Общий бэкенд (memcached в infra/docker-compose.yml) делит его между ними.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
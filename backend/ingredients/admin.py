@@ -7,5 +7,6 @@ from .models import Ingredient
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
     search_fields = ('name', )
-    list_filter = ('name', )
+    list_filter = ('measurement_unit', )
     list_per_page = 20
+    show_full_result_count = False
@@ -0,0 +1,60 @@
+# Generated by Django 3.2.16 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+# Модель, ссылающаяся на ингредиент: (поле владельца, предел количества).
+REFERENCES = {
+    'IngredientsinRecipe': ('recipe_id', 32767),
+    'ShoppingListItem': ('user_id', None),
+}
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """
+    Оставляет по одному ингредиенту на пару (название, единица):
+    ссылки на повторы переносятся на первый, количества одного рецепта
+    или списка покупок складываются.
+    """
+    Ingredient = apps.get_model('ingredients', 'Ingredient')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        count=models.Count('id'),
+        first_id=models.Min('id')
+    ).filter(count__gt=1).order_by()
+    for duplicate in list(duplicates):
+        first_id = duplicate['first_id']
+        ids = list(Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit']
+        ).exclude(id=first_id).values_list('id', flat=True))
+        for model_name, (owner, limit) in REFERENCES.items():
+            model = apps.get_model('recipes', model_name)
+            for row in model.objects.filter(ingredient_id__in=ids):
+                kept = model.objects.filter(
+                    **{owner: getattr(row, owner)}, ingredient_id=first_id
+                ).first()
+                if kept is None:
+                    row.ingredient_id = first_id
+                    row.save(update_fields=['ingredient'])
+                    continue
+                kept.amount += row.amount
+                if limit is not None:
+                    kept.amount = min(kept.amount, limit)
+                kept.save(update_fields=['amount'])
+                row.delete()
+        Ingredient.objects.filter(id__in=ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredients', '0002_ingredient_name_trigram_index'),
+        ('recipes', '0011_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.16 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+# Отдельно от слияния повторов (0003): PostgreSQL не выполняет ALTER TABLE
+# в транзакции с отложенными проверками внешних ключей.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredients', '0003_merge_duplicate_ingredients'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_name_unit'),
+        ),
+    ]
@@ -1,17 +1,30 @@
 from django.contrib import admin
+from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
+from django.db import transaction
 
+from backend.admin import (AuthorInputFilter, RecipeInputFilter,
+                           ScalableAdmin, UserInputFilter)
+
+from .feed import add_recipe_to_feeds, move_recipe_in_feeds
 from .models import Favorite, IngredientsinRecipe, Recipe, ShoppingCart
+from .images import schedule_image_derivatives
+from .popularity import change_counter
+from .search import update_search_index
+from .shopping_list import change_recipe_in_shopping_lists, get_recipe_amounts
+
+User = get_user_model()
 
 
 class IngredientsinRecipeInLine(admin.StackedInline):
     model = IngredientsinRecipe
     extra = 1
     min_num = 1
+    autocomplete_fields = ('ingredient', )
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(ScalableAdmin):
     inlines = (IngredientsinRecipeInLine, )
     list_display = (
         'name',
@@ -23,10 +36,38 @@ class RecipeAdmin(admin.ModelAdmin):
         'get_ingredients',
         'get_count',
         'pub_date')
-    list_filter = ('name', 'author', 'tags')
-    list_per_page = 20
+    list_select_related = ('author', )
+    list_filter = (AuthorInputFilter, 'tags')
+    search_fields = ('name', )
+    autocomplete_fields = ('author', )
     filter_horizontal = ('tags', )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            'tags', 'ingredients'
+        )
+
+    def save_model(self, request, obj, form, change):
+        if 'image' in form.changed_data:
+            obj.image_digest = ''
+        super().save_model(request, obj, form, change)
+        if not change:
+            add_recipe_to_feeds(obj.id)
+        elif 'author' in form.changed_data:
+            move_recipe_in_feeds(obj.id)
+            change_counter(User, form.initial['author'], 'recipes_count', -1)
+            change_counter(User, obj.author_id, 'recipes_count', 1)
+        if 'image' in form.changed_data:
+            schedule_image_derivatives(obj)
+
+    def save_related(self, request, form, formsets, change):
+        old_amounts = get_recipe_amounts(form.instance.id)
+        super().save_related(request, form, formsets, change)
+        change_recipe_in_shopping_lists(
+            form.instance.id, old_amounts, get_recipe_amounts(form.instance.id)
+        )
+        update_search_index([form.instance.id])
+
     @admin.display(description='Теги')
     def get_tags(self, obj):
         return ', '.join([
@@ -39,30 +80,74 @@ class RecipeAdmin(admin.ModelAdmin):
             ingredient.name for ingredient in obj.ingredients.all()
         ])
 
-    @admin.display(description='Число добавлений в избранное')
+    @admin.display(
+        description='Число добавлений в избранное',
+        ordering='favorites_count'
+    )
     def get_count(self, obj):
-        return obj.favorite_recipe.count()
+        return obj.favorites_count
 
 
 @admin.register(IngredientsinRecipe)
-class IngredientsinRecipeAdmin(admin.ModelAdmin):
+class IngredientsinRecipeAdmin(ScalableAdmin):
     list_display = ('id', 'recipe', 'ingredient', 'amount')
-    list_filter = ('recipe', )
-    list_per_page = 20
+    list_select_related = ('recipe', 'ingredient')
+    list_filter = (RecipeInputFilter, )
+    autocomplete_fields = ('recipe', 'ingredient')
+
+    def save_model(self, request, obj, form, change):
+        recipe_ids = {obj.recipe_id}
+        if change and 'recipe' in form.changed_data:
+            recipe_ids.add(form.initial['recipe'])
+        self.change_recipes(
+            recipe_ids, super().save_model, request, obj, form, change
+        )
+
+    def delete_model(self, request, obj):
+        self.change_recipes(
+            {obj.recipe_id}, super().delete_model, request, obj
+        )
+
+    def delete_queryset(self, request, queryset):
+        self.change_recipes(
+            set(queryset.values_list('recipe_id', flat=True)),
+            super().delete_queryset, request, queryset
+        )
+
+    @staticmethod
+    def change_recipes(recipe_ids, change, *args):
+        """
+        Выполняет change(*args) и, как RecipeAdmin.save_related, переносит
+        изменение состава рецептов в списки покупок и поисковый индекс.
+        Версии рецептов меняют сигналы IngredientsinRecipe.
+        """
+        with transaction.atomic():
+            old_amounts = {
+                recipe_id: get_recipe_amounts(recipe_id)
+                for recipe_id in recipe_ids
+            }
+            change(*args)
+            for recipe_id, amounts in old_amounts.items():
+                change_recipe_in_shopping_lists(
+                    recipe_id, amounts, get_recipe_amounts(recipe_id)
+                )
+            update_search_index(list(recipe_ids))
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(ScalableAdmin):
     list_display = ('id', 'user', 'recipe')
-    list_filter = ('user', 'recipe')
-    list_per_page = 20
+    list_select_related = ('user', 'recipe')
+    list_filter = (UserInputFilter, RecipeInputFilter)
+    autocomplete_fields = ('user', 'recipe')
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(ScalableAdmin):
     list_display = ('id', 'user', 'recipe')
-    list_filter = ('user', 'recipe')
-    list_per_page = 20
+    list_select_related = ('user', 'recipe')
+    list_filter = (UserInputFilter, RecipeInputFilter)
+    autocomplete_fields = ('user', 'recipe')
 
 
 admin.site.unregister(Group)
@@ -0,0 +1,95 @@
+"""
+Поддержка таблицы FeedItem - ленты рецептов авторов из подписок.
+
+Лента заполняется при записи: новый рецепт одним запросом добавляется
+всем подписчикам автора, подписка добавляет в ленту все рецепты автора,
+отписка их удаляет. Удаление рецепта или пользователя чистит ленты
+каскадно.
+"""
+
+from django.db import connection
+
+from users.models import Subscription
+
+from .models import FeedItem, Recipe
+
+FEED = FeedItem._meta.db_table
+RECIPES = Recipe._meta.db_table
+SUBSCRIPTIONS = Subscription._meta.db_table
+
+
+def add_recipe_to_feeds(recipe_id):
+    add_recipes_to_feeds([recipe_id])
+
+
+def add_recipes_to_feeds(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            INSERT INTO {FEED} (user_id, recipe_id, author_id, pub_date)
+            SELECT subscription.user_id, recipe.id, recipe.author_id,
+                recipe.pub_date
+            FROM {RECIPES} recipe
+            JOIN {SUBSCRIPTIONS} subscription
+                ON subscription.author_id = recipe.author_id
+            WHERE recipe.id IN ({", ".join(["%s"] * len(recipe_ids))})
+            ON CONFLICT (user_id, recipe_id) DO NOTHING
+            ''',
+            recipe_ids
+        )
+
+
+def move_recipe_in_feeds(recipe_id):
+    """Переносит рецепт в ленты подписчиков его нового автора."""
+    FeedItem.objects.filter(recipe_id=recipe_id).delete()
+    add_recipe_to_feeds(recipe_id)
+
+
+def add_author_to_feed(user_id, author_id):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            INSERT INTO {FEED} (user_id, recipe_id, author_id, pub_date)
+            SELECT %s, id, author_id, pub_date
+            FROM {RECIPES}
+            WHERE author_id = %s
+            ON CONFLICT (user_id, recipe_id) DO NOTHING
+            ''',
+            [user_id, author_id]
+        )
+
+
+def remove_author_from_feed(user_id, author_id):
+    FeedItem.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def get_expected_feeds(user_ids=None):
+    """Ленты, посчитанные заново по подпискам."""
+    # Одно условие filter(): иначе к подпискам будет второй JOIN.
+    if user_ids is None:
+        recipes = Recipe.objects.filter(author__subscription__isnull=False)
+    else:
+        recipes = Recipe.objects.filter(
+            author__subscription__user_id__in=user_ids
+        )
+    return {
+        (user_id, recipe_id): (author_id, pub_date)
+        for user_id, recipe_id, author_id, pub_date in recipes.values_list(
+            'author__subscription__user_id', 'id', 'author_id', 'pub_date'
+        ).order_by().iterator()
+    }
+
+
+def get_stored_feeds(user_ids=None):
+    items = FeedItem.objects.all()
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+    return {
+        (user_id, recipe_id): (author_id, pub_date)
+        for user_id, recipe_id, author_id, pub_date in items.values_list(
+            'user_id', 'recipe_id', 'author_id', 'pub_date'
+        ).iterator()
+    }
@@ -0,0 +1,115 @@
+"""
+Уменьшенные копии изображений рецептов в формате WebP.
+
+Копии рендерятся в фоновом потоке после фиксации транзакции и
+сохраняются под хешем содержимого оригинала, поэтому их адрес меняется
+вместе с изображением и nginx может отдавать их с бессрочным кэшем.
+Пока копии не готовы, в Recipe.image_digest пусто и клиентам отдается
+оригинал.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .models import Recipe
+
+DERIVATIVES_DIRECTORY = 'recipes/derivatives'
+DERIVATIVE_SIZES = {
+    'card': (480, 480),
+    'detail': (960, 960),
+    'retina': (1920, 1920),
+}
+DERIVATIVE_QUALITY = 80
+CHUNK_SIZE = 64 * 1024
+
+storage = Recipe._meta.get_field('image').storage
+executor = ThreadPoolExecutor(max_workers=2)
+logger = logging.getLogger(__name__)
+
+
+def get_file_digest(file):
+    digest = sha256()
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def get_derivative_name(digest, variant):
+    width, height = DERIVATIVE_SIZES[variant]
+    return f'{DERIVATIVES_DIRECTORY}/{digest}-{variant}-{width}x{height}.webp'
+
+
+def get_image_names(recipe):
+    """Имена файлов для каждого размера; оригинал, если копий еще нет."""
+    if not recipe.image:
+        return None
+    return {
+        variant: (
+            get_derivative_name(recipe.image_digest, variant)
+            if recipe.image_digest else recipe.image.name
+        )
+        for variant in DERIVATIVE_SIZES
+    }
+
+
+def render_derivatives(image_name):
+    """Рендерит недостающие копии изображения и возвращает его хеш."""
+    with storage.open(image_name) as file:
+        digest = get_file_digest(file)
+        names = {
+            variant: get_derivative_name(digest, variant)
+            for variant in DERIVATIVE_SIZES
+        }
+        missing = [
+            variant for variant, name in names.items()
+            if not storage.exists(name)
+        ]
+        if not missing:
+            return digest
+        image = ImageOps.exif_transpose(Image.open(file))
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert(
+                'RGBA' if 'transparency' in image.info else 'RGB'
+            )
+        for variant in missing:
+            derivative = image.copy()
+            derivative.thumbnail(DERIVATIVE_SIZES[variant], Image.LANCZOS)
+            buffer = BytesIO()
+            derivative.save(
+                buffer, 'WEBP', quality=DERIVATIVE_QUALITY, method=4
+            )
+            storage.save_once(
+                names[variant], ContentFile(buffer.getvalue())
+            )
+    return digest
+
+
+def update_image_derivatives(recipe_id, image_name):
+    try:
+        digest = render_derivatives(image_name)
+        recipe = Recipe.objects.filter(id=recipe_id, image=image_name).first()
+        if recipe is not None and recipe.image_digest != digest:
+            recipe.image_digest = digest
+            recipe.save(update_fields=['image_digest'])
+    except Exception:
+        # Без копий клиентам продолжает отдаваться оригинал.
+        logger.exception(
+            'Не удалось подготовить копии изображения %s', image_name
+        )
+    finally:
+        close_old_connections()
+
+
+def schedule_image_derivatives(recipe):
+    """Ставит рендеринг копий в очередь после фиксации транзакции."""
+    recipe_id, image_name = recipe.id, recipe.image.name
+    transaction.on_commit(lambda: executor.submit(
+        update_image_derivatives, recipe_id, image_name
+    ))
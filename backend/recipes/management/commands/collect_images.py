@@ -0,0 +1,99 @@
+import os
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.images import (DERIVATIVE_SIZES, DERIVATIVES_DIRECTORY,
+                            get_derivative_name)
+from recipes.models import Recipe
+
+IMAGES_DIRECTORY = Recipe._meta.get_field('image').upload_to
+
+
+def walk(storage, directory):
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield f'{directory}/{name}'
+    for name in directories:
+        yield from walk(storage, f'{directory}/{name}')
+
+
+def format_size(size):
+    for unit in ('Б', 'КБ', 'МБ'):
+        if size < 1024:
+            return f'{size:.0f} {unit}'
+        size /= 1024
+    return f'{size:.1f} ГБ'
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет изображения рецептов и их копии, на которые не ссылается '
+        'ни один рецепт, и показывает, сколько места сэкономлено'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено'
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60 * 60,
+            help=(
+                'Не удалять файлы моложе указанного количества секунд: '
+                'они могут принадлежать незавершенной загрузке'
+            )
+        )
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        references = Counter(
+            Recipe.objects.exclude(image='').values_list('image', flat=True)
+        )
+        digests = set(
+            Recipe.objects.exclude(
+                image_digest=''
+            ).values_list('image_digest', flat=True)
+        )
+        digests.update(
+            os.path.splitext(os.path.basename(name))[0]
+            for name in references
+        )
+        derivatives = {
+            get_derivative_name(digest, variant)
+            for digest in digests for variant in DERIVATIVE_SIZES
+        }
+        deadline = timezone.now() - timedelta(seconds=options['min_age'])
+        deleted = reclaimed = kept = 0
+        for directory in (IMAGES_DIRECTORY, DERIVATIVES_DIRECTORY):
+            if not storage.exists(directory):
+                continue
+            for name in walk(storage, directory):
+                if name in references or name in derivatives:
+                    kept += storage.size(name)
+                    continue
+                if storage.get_modified_time(name) > deadline:
+                    continue
+                deleted += 1
+                reclaimed += storage.size(name)
+                if not options['dry_run']:
+                    storage.delete(name)
+        shared = sum(
+            storage.size(name) * (count - 1)
+            for name, count in references.items()
+            if count > 1 and storage.exists(name)
+        )
+        action = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(
+            f'{action} файлов: {deleted}, освобождено: '
+            f'{format_size(reclaimed)}'
+        )
+        self.stdout.write(
+            f'Используется: {format_size(kept)}, сэкономлено за счет '
+            f'общих файлов у рецептов: {format_size(shared)}'
+        )
@@ -0,0 +1,455 @@
+import random
+import time
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from api_foodgram.versions import bump_versions
+from backend.constants import MAX_LENGTH_RECIPE
+from ingredients.models import Ingredient
+from recipes.feed import add_recipes_to_feeds
+from recipes.images import render_derivatives, storage
+from recipes.models import (Favorite, FeedItem, IngredientsinRecipe, Recipe,
+                            ShoppingCart, ShoppingListItem)
+from recipes.popularity import rollup_counters, update_trending_scores
+from recipes.search import update_search_index
+from recipes.shopping_list import fill_shopping_lists
+from tags.models import Tag
+from users.models import Subscription
+
+User = get_user_model()
+
+IMAGES_DIRECTORY = Recipe._meta.get_field('image').upload_to
+# Размер списка id в одном запросе: старые сборки SQLite принимают
+# не больше 999 параметров.
+ID_CHUNK_SIZE = 500
+# Показатель закона Ципфа для популярности рецептов и ингредиентов.
+ZIPF_EXPONENT = 1.1
+DEFAULT_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F2C94C', 'dessert'),
+    ('Выпечка', '#B5651D', 'bakery'),
+    ('Вегетарианское', '#2D9CDB', 'vegetarian'),
+)
+FIRST_NAMES = (
+    'Анна', 'Иван', 'Мария', 'Алексей', 'Ольга', 'Дмитрий', 'Елена',
+    'Сергей', 'Наталья', 'Андрей', 'Татьяна', 'Михаил', 'Ирина', 'Павел',
+)
+LAST_NAMES = (
+    'Ким', 'Ли', 'Шевчук', 'Бондаренко', 'Коваль', 'Мельник', 'Кравец',
+    'Ткаченко', 'Савченко', 'Лысенко', 'Гром', 'Зайченко',
+)
+DISHES = (
+    'Салат', 'Суп', 'Рагу', 'Запеканка', 'Пирог', 'Омлет', 'Паста',
+    'Плов', 'Каша', 'Смузи', 'Рулет', 'Котлеты', 'Жаркое', 'Оладьи',
+)
+STEPS = (
+    'Подготовьте {}.',
+    'Нарежьте {} небольшими кусочками.',
+    'Смешайте {} в глубокой миске.',
+    'Обжарьте {} на среднем огне.',
+    'Добавьте {} и перемешайте.',
+    'Готовьте {} под крышкой до мягкости.',
+    'Подавайте, украсив {}.',
+)
+
+
+def get_cum_weights(size, rng):
+    """
+    Накопленные веса закона Ципфа для size элементов: популярность
+    распределяется по случайной перестановке, а не по порядку id.
+    """
+    ranks = list(range(1, size + 1))
+    rng.shuffle(ranks)
+    return list(accumulate(1 / rank ** ZIPF_EXPONENT for rank in ranks))
+
+
+def get_exponential_count(mean, rng):
+    return round(rng.expovariate(1 / mean)) if mean > 0 else 0
+
+
+def get_chunks(items, size=ID_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает синтетические данные для нагрузочного тестирования: '
+        'пользователей, рецепты (число рецептов у автора распределено по '
+        'закону Парето), подписки, избранное и корзины на основе '
+        'загруженных ингредиентов. Результат воспроизводим при одинаковом '
+        '--seed и одинаковой исходной базе'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=1000,
+            help='Количество создаваемых пользователей'
+        )
+        parser.add_argument(
+            '--authors-share',
+            type=float,
+            default=0.2,
+            help='Доля пользователей, публикующих рецепты'
+        )
+        parser.add_argument(
+            '--pareto-alpha',
+            type=float,
+            default=1.5,
+            help='Параметр распределения Парето для числа рецептов у '
+                 'автора: чем меньше, тем длиннее хвост; среднее - '
+                 'alpha / (alpha - 1)'
+        )
+        parser.add_argument(
+            '--max-recipes-per-author',
+            type=int,
+            default=500,
+            help='Максимальное количество рецептов у одного автора'
+        )
+        parser.add_argument(
+            '--subscriptions',
+            type=float,
+            default=5,
+            help='Среднее количество подписок у пользователя'
+        )
+        parser.add_argument(
+            '--favorites',
+            type=float,
+            default=10,
+            help='Среднее количество рецептов в избранном у пользователя'
+        )
+        parser.add_argument(
+            '--carts',
+            type=float,
+            default=2,
+            help='Среднее количество рецептов в корзине у пользователя'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='За сколько последних дней распределены даты публикации'
+        )
+        parser.add_argument(
+            '--images',
+            type=int,
+            default=8,
+            help='Количество разных изображений, общих для всех рецептов'
+        )
+        parser.add_argument(
+            '--password',
+            default='password',
+            help='Пароль всех создаваемых пользователей'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Начальное значение генератора случайных чисел'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Количество объектов, создаваемых за один проход'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users должно быть положительным')
+        if not 0 < options['authors_share'] <= 1:
+            raise CommandError('--authors-share должно быть в (0, 1]')
+        if options['pareto_alpha'] <= 0:
+            raise CommandError('--pareto-alpha должно быть положительным')
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.ingredients = list(
+            Ingredient.objects.order_by('id').values_list('id', 'name')
+        )
+        if not self.ingredients:
+            raise CommandError(
+                'Нет ингредиентов: сначала выполните load_ingredients'
+            )
+        self.ingredient_weights = get_cum_weights(
+            len(self.ingredients), self.rng
+        )
+        started = time.monotonic()
+        self.rows = 0
+        with transaction.atomic():
+            self.tags = self.get_tags()
+            self.images = self.create_images()
+            user_ids = self.create_users()
+            authors = self.create_recipes(user_ids)
+            self.create_relations(user_ids, authors)
+            self.fill_denormalizations()
+            self.reset_sequences()
+            bump_versions('tags', 'recipes', 'popularity')
+        self.stdout.write(
+            f'Готово: {self.rows} строк за '
+            f'{time.monotonic() - started:.1f} с'
+        )
+
+    def report(self, title, rows, started):
+        self.rows += rows
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'{title}: {rows} строк за {elapsed:.1f} с, '
+            f'{rows / max(elapsed, 1e-6):.0f} строк/с'
+        )
+
+    def get_tags(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in DEFAULT_TAGS
+            )
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def create_images(self):
+        """Сохраняет изображения-заглушки и рендерит их копии один раз."""
+        images = []
+        for _ in range(self.options['images']):
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            buffer = BytesIO()
+            Image.new('RGB', (1200, 900), color).save(buffer, 'JPEG')
+            name = storage.save(
+                f'{IMAGES_DIRECTORY}/generated.jpg',
+                ContentFile(buffer.getvalue())
+            )
+            images.append((name, render_derivatives(name)))
+        if not images:
+            raise CommandError('--images должно быть положительным')
+        return images
+
+    def create_users(self):
+        started = time.monotonic()
+        first_id = (User.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        user_ids = list(range(first_id, first_id + self.options['users']))
+        usernames = [f'user{pk}' for pk in user_ids]
+        if any(
+            User.objects.filter(username__in=chunk).exists()
+            for chunk in get_chunks(usernames)
+        ):
+            raise CommandError('Пользователи user<id> уже существуют')
+        password = make_password(self.options['password'])
+        User.objects.bulk_create(
+            (
+                User(
+                    id=pk,
+                    username=username,
+                    email=f'{username}@example.com',
+                    first_name=self.rng.choice(FIRST_NAMES),
+                    last_name=self.rng.choice(LAST_NAMES),
+                    password=password,
+                )
+                for pk, username in zip(user_ids, usernames)
+            ),
+            batch_size=self.batch_size
+        )
+        self.report('Пользователи', len(user_ids), started)
+        return user_ids
+
+    def create_recipes(self, user_ids):
+        """
+        Создает рецепты авторов, возвращает {id автора: id рецептов}.
+        """
+        started = time.monotonic()
+        options = self.options
+        authors = self.rng.sample(
+            user_ids,
+            max(1, round(len(user_ids) * options['authors_share']))
+        )
+        counts = {
+            author_id: min(
+                options['max_recipes_per_author'],
+                int(self.rng.paretovariate(options['pareto_alpha']))
+            )
+            for author_id in authors
+        }
+        first_id = (Recipe.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        recipe_ids = {}
+        recipes, tags, links = [], [], []
+        rows = 0
+        now = timezone.now()
+        for author_id, count in counts.items():
+            recipe_ids[author_id] = list(range(first_id, first_id + count))
+            for pk in recipe_ids[author_id]:
+                recipe, recipe_tags, recipe_links = self.build_recipe(
+                    pk, author_id, now
+                )
+                recipes.append(recipe)
+                tags.extend(recipe_tags)
+                links.extend(recipe_links)
+                if len(recipes) >= self.batch_size:
+                    rows += self.save_recipes(recipes, tags, links)
+                    recipes, tags, links = [], [], []
+            first_id += count
+        rows += self.save_recipes(recipes, tags, links)
+        self.report('Рецепты', rows, started)
+        return recipe_ids
+
+    def build_recipe(self, pk, author_id, now):
+        rng = self.rng
+        ingredients = dict(
+            rng.choices(
+                self.ingredients,
+                cum_weights=self.ingredient_weights,
+                k=rng.randint(3, 12)
+            )
+        )
+        names = list(ingredients.values())
+        name = f'{rng.choice(DISHES)}: {", ".join(names[:2])}'
+        text = ' '.join(
+            rng.choice(STEPS).format(ingredient) for ingredient in names
+        )
+        image, digest = rng.choice(self.images)
+        recipe = Recipe(
+            id=pk,
+            author_id=author_id,
+            name=name[:MAX_LENGTH_RECIPE],
+            text=text,
+            cooking_time=rng.randint(5, 180),
+            image=image,
+            image_digest=digest,
+            pub_date=now - rng.random() * timedelta(
+                days=self.options['days']
+            ),
+        )
+        tags = [
+            Recipe.tags.through(recipe_id=pk, tag_id=tag_id)
+            for tag_id in rng.sample(
+                self.tags, rng.randint(1, min(3, len(self.tags)))
+            )
+        ]
+        links = [
+            IngredientsinRecipe(
+                recipe_id=pk,
+                ingredient_id=ingredient_id,
+                amount=rng.randint(1, 1000)
+            )
+            for ingredient_id in ingredients
+        ]
+        return recipe, tags, links
+
+    def save_recipes(self, recipes, tags, links):
+        """
+        bulk_create заменяет pub_date текущим временем из-за auto_now_add,
+        поэтому даты публикации записываются вторым запросом.
+        """
+        pub_dates = [recipe.pub_date for recipe in recipes]
+        Recipe.objects.bulk_create(recipes, batch_size=self.batch_size)
+        for recipe, pub_date in zip(recipes, pub_dates):
+            recipe.pub_date = pub_date
+        Recipe.objects.bulk_update(
+            recipes, ['pub_date'], batch_size=self.batch_size
+        )
+        Recipe.tags.through.objects.bulk_create(
+            tags, batch_size=self.batch_size
+        )
+        IngredientsinRecipe.objects.bulk_create(
+            links, batch_size=self.batch_size
+        )
+        return len(recipes) + len(tags) + len(links)
+
+    def create_relations(self, user_ids, authors):
+        """
+        Подписки, избранное и корзины новых пользователей. Популярность
+        рецептов подчиняется закону Ципфа, авторов - растет с числом их
+        рецептов (как квадратный корень, чтобы ленты не разрастались
+        квадратично).
+        """
+        started = time.monotonic()
+        author_ids = list(authors)
+        author_weights = list(accumulate(
+            len(authors[author_id]) ** 0.5 for author_id in author_ids
+        ))
+        recipe_ids = [pk for ids in authors.values() for pk in ids]
+        recipe_weights = get_cum_weights(len(recipe_ids), self.rng)
+        relations = (
+            (Subscription, 'author_id', author_ids, author_weights,
+             self.options['subscriptions']),
+            (Favorite, 'recipe_id', recipe_ids, recipe_weights,
+             self.options['favorites']),
+            (ShoppingCart, 'recipe_id', recipe_ids, recipe_weights,
+             self.options['carts']),
+        )
+        rows = 0
+        for start in range(0, len(user_ids), self.batch_size):
+            batch = user_ids[start:start + self.batch_size]
+            for model, field, population, weights, mean in relations:
+                objects = []
+                for user_id in batch:
+                    chosen = set(self.rng.choices(
+                        population,
+                        cum_weights=weights,
+                        k=get_exponential_count(mean, self.rng)
+                    ))
+                    if model is Subscription:
+                        chosen.discard(user_id)
+                    objects.extend(
+                        model(user_id=user_id, **{field: pk})
+                        for pk in chosen
+                    )
+                model.objects.bulk_create(objects, batch_size=self.batch_size)
+                rows += len(objects)
+        self.report('Подписки, избранное и корзины', rows, started)
+        self.user_ids = user_ids
+        self.recipe_ids = recipe_ids
+
+    def fill_denormalizations(self):
+        """
+        bulk_create не отправляет сигналы: ленты, списки покупок,
+        поисковый индекс и счетчики заполняются пачками запросов
+        INSERT ... SELECT. id новых объектов идут подряд.
+        """
+        started = time.monotonic()
+        for chunk in get_chunks(self.recipe_ids):
+            add_recipes_to_feeds(chunk)
+        rows = FeedItem.objects.filter(
+            user_id__gte=self.user_ids[0]
+        ).count()
+        self.report('Ленты', rows, started)
+        started = time.monotonic()
+        for chunk in get_chunks(self.user_ids):
+            fill_shopping_lists(chunk)
+        rows = ShoppingListItem.objects.filter(
+            user_id__gte=self.user_ids[0]
+        ).count()
+        self.report('Списки покупок', rows, started)
+        started = time.monotonic()
+        for chunk in get_chunks(self.recipe_ids):
+            update_search_index(chunk)
+        self.report('Поисковый индекс', len(self.recipe_ids), started)
+        started = time.monotonic()
+        rollup_counters()
+        update_trending_scores()
+        self.stdout.write(
+            f'Счетчики: {time.monotonic() - started:.1f} с'
+        )
+
+    def reset_sequences(self):
+        """
+        id задавались явно; PostgreSQL нужно сдвинуть последовательности,
+        SQLite делает это сам.
+        """
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), [User, Recipe]
+            ):
+                cursor.execute(sql)
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import render_derivatives
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создает уменьшенные копии изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Обработать все рецепты, а не только без готовых копий'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').order_by('id')
+        if not options['all']:
+            recipes = recipes.filter(image_digest='')
+        total = recipes.count()
+        for number, recipe in enumerate(recipes.iterator(), start=1):
+            try:
+                digest = render_derivatives(recipe.image.name)
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'Рецепт {recipe.id}: {error}')
+                continue
+            if recipe.image_digest != digest:
+                recipe.image_digest = digest
+                recipe.save(update_fields=['image_digest'])
+            self.stdout.write(f'Обработано рецептов: {number} из {total}')
+        self.stdout.write('Копии изображений созданы')
@@ -0,0 +1,330 @@
+import json
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from api_foodgram.fields import Base64ImageField
+from api_foodgram.versions import bump_versions
+from backend.constants import MAX_LENGTH_RECIPE
+from ingredients.models import Ingredient
+from recipes.feed import add_recipes_to_feeds
+from recipes.images import render_derivatives, storage
+from recipes.models import IngredientsinRecipe, Recipe
+from recipes.popularity import change_counter
+from recipes.search import update_search_index
+from tags.models import Tag
+
+User = get_user_model()
+
+IMAGES_DIRECTORY = Recipe._meta.get_field('image').upload_to
+MAX_SMALL_INTEGER = 32767
+
+
+class RecipeError(Exception):
+    pass
+
+
+def store_image(source, base_directory):
+    """
+    Проверяет и сохраняет изображение рецепта, рендерит его копии.
+    Выполняется в процессе пула: возвращает имя файла и хеш или текст
+    ошибки, исключения между процессами не передаются.
+    """
+    field = Base64ImageField()
+    try:
+        if source.startswith('data:'):
+            # Изображение проверяется при декодировании.
+            image = field.to_internal_value(source)
+        else:
+            path = Path(base_directory, source)
+            image = File(open(path, 'rb'), name=path.name)
+        with image:
+            if not source.startswith('data:'):
+                field.validate_image(image)
+            name = storage.save(f'{IMAGES_DIRECTORY}/{image.name}', image)
+        return name, render_derivatives(name), None
+    except ValidationError as error:
+        return None, None, ' '.join(map(str, error.detail))
+    except OSError as error:
+        return None, None, f'не удалось прочитать изображение: {error}'
+
+
+def get_positive_integer(data, key):
+    value = data.get(key)
+    if (
+        not isinstance(value, int) or isinstance(value, bool)
+        or not 1 <= value <= MAX_SMALL_INTEGER
+    ):
+        raise RecipeError(
+            f'{key} должно быть целым числом от 1 до {MAX_SMALL_INTEGER}'
+        )
+    return value
+
+
+def is_reference(value):
+    """Автор задается email или id."""
+    return isinstance(value, (str, int)) and not isinstance(value, bool)
+
+
+def get_list(data, key):
+    value = data.get(key, [])
+    if not isinstance(value, list):
+        raise RecipeError(f'{key} должно быть списком')
+    return value
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует рецепты из NDJSON: по одному JSON-объекту на строку с '
+        'полями author (email или id), name, text, cooking_time, tags '
+        '(слаги), ingredients ({name, measurement_unit, amount}) и image '
+        '(путь к файлу или data URI с base64)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл NDJSON, "-" - стандартный ввод'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество рецептов, записываемых в одной транзакции'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Количество процессов для обработки изображений, '
+                 'по умолчанию - по числу ядер'
+        )
+        parser.add_argument(
+            '--images-dir',
+            default=None,
+            help='Каталог, от которого отсчитываются пути изображений, '
+                 'по умолчанию - каталог файла'
+        )
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            file = sys.stdin
+            base_directory = Path.cwd()
+        else:
+            path = Path(options['path'])
+            if not path.exists():
+                raise CommandError(f'Файл {path} не найден')
+            file = open(path, encoding='utf-8')
+            base_directory = path.parent
+        if options['images_dir']:
+            base_directory = Path(options['images_dir'])
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredients = {
+            (name, measurement_unit): ingredient_id
+            for ingredient_id, name, measurement_unit
+            in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            ).iterator()
+        }
+        self.authors = {}
+        imported = failed = 0
+        started = time.monotonic()
+        lines = enumerate(file, start=1)
+        with file, ProcessPoolExecutor(
+            max_workers=options['workers'], initializer=django.setup
+        ) as executor:
+            while True:
+                batch = list(islice(lines, options['batch_size']))
+                if not batch:
+                    break
+                total = len([line for _, line in batch if line.strip()])
+                recipes = self.parse(batch)
+                recipes = self.store_images(
+                    recipes, executor, base_directory
+                )
+                self.save(recipes)
+                imported += len(recipes)
+                failed += total - len(recipes)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'Импортировано: {imported}, с ошибками: {failed}, '
+                    f'{imported / elapsed:.1f} рецептов/с'
+                )
+        if imported:
+            bump_versions('recipes')
+        self.stdout.write(
+            f'Готово: {imported} рецептов за '
+            f'{time.monotonic() - started:.1f} с, с ошибками: {failed}'
+        )
+
+    def report(self, number, message):
+        self.stderr.write(f'Строка {number}: {message}')
+
+    def parse(self, batch):
+        """Разбирает строки пачки и заменяет ссылки на id."""
+        rows = []
+        for number, line in batch:
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+                if not isinstance(data, dict):
+                    raise RecipeError('ожидался JSON-объект')
+            except (ValueError, RecipeError) as error:
+                self.report(number, error)
+                continue
+            rows.append((number, data))
+        self.load_authors(data.get('author') for _, data in rows)
+        recipes = []
+        for number, data in rows:
+            try:
+                recipes.append((number, self.build(data)))
+            except RecipeError as error:
+                self.report(number, error)
+        return recipes
+
+    def load_authors(self, references):
+        """Догружает авторов пачки одним запросом на email и на id."""
+        emails, ids = set(), set()
+        for reference in references:
+            if not is_reference(reference) or reference in self.authors:
+                continue
+            if isinstance(reference, str):
+                emails.add(reference)
+            else:
+                ids.add(reference)
+        if emails:
+            self.authors.update(
+                User.objects.filter(
+                    email__in=emails
+                ).values_list('email', 'id')
+            )
+        if ids:
+            self.authors.update(
+                (pk, pk)
+                for pk in User.objects.filter(id__in=ids).values_list(
+                    'id', flat=True
+                )
+            )
+
+    def build(self, data):
+        author = data.get('author')
+        author_id = self.authors.get(author) if is_reference(author) else None
+        if author_id is None:
+            raise RecipeError(f'автор {data.get("author")!r} не найден')
+        name = data.get('name')
+        text = data.get('text')
+        if not isinstance(name, str) or not name.strip():
+            raise RecipeError('не указано название')
+        if len(name) > MAX_LENGTH_RECIPE:
+            raise RecipeError(
+                f'название длиннее {MAX_LENGTH_RECIPE} символов'
+            )
+        if not isinstance(text, str) or not text.strip():
+            raise RecipeError('не указано описание')
+        image = data.get('image')
+        if not isinstance(image, str) or not image:
+            raise RecipeError('не указано изображение')
+        tags = get_list(data, 'tags')
+        missing = [
+            slug for slug in tags
+            if not isinstance(slug, str) or slug not in self.tags
+        ]
+        if missing:
+            raise RecipeError(
+                f'теги не найдены: {", ".join(map(str, missing))}'
+            )
+        if len(set(tags)) != len(tags):
+            raise RecipeError('теги повторяются')
+        amounts = {}
+        for ingredient in get_list(data, 'ingredients'):
+            if not isinstance(ingredient, dict):
+                raise RecipeError('ингредиент должен быть JSON-объектом')
+            key = (
+                ingredient.get('name'), ingredient.get('measurement_unit')
+            )
+            ingredient_id = (
+                self.ingredients.get(key)
+                if all(isinstance(part, str) for part in key) else None
+            )
+            if ingredient_id is None:
+                raise RecipeError(f'ингредиент {key[0]}, {key[1]} не найден')
+            if ingredient_id in amounts:
+                raise RecipeError('ингредиенты повторяются')
+            amounts[ingredient_id] = get_positive_integer(
+                ingredient, 'amount'
+            )
+        return {
+            'recipe': Recipe(
+                author_id=author_id,
+                name=name,
+                text=text,
+                cooking_time=get_positive_integer(data, 'cooking_time'),
+            ),
+            'image': image,
+            'tags': [self.tags[slug] for slug in tags],
+            'ingredients': amounts,
+        }
+
+    def store_images(self, recipes, executor, base_directory):
+        results = executor.map(
+            store_image,
+            [recipe['image'] for _, recipe in recipes],
+            [base_directory] * len(recipes),
+            chunksize=8
+        )
+        stored = []
+        for (number, recipe), (name, digest, error) in zip(recipes, results):
+            if error is not None:
+                self.report(number, error)
+                continue
+            recipe['recipe'].image = name
+            recipe['recipe'].image_digest = digest
+            stored.append(recipe)
+        return stored
+
+    @transaction.atomic
+    def save(self, recipes):
+        objects = [recipe['recipe'] for recipe in recipes]
+        Recipe.objects.bulk_create(objects)
+        if objects and objects[0].pk is None:
+            # SQLite в Django 3.2 не возвращает id из bulk_create. Он
+            # держит блокировку записи до конца транзакции, поэтому
+            # id вставленных строк - последние по порядку.
+            ids = Recipe.objects.order_by('-id').values_list(
+                'id', flat=True
+            )[:len(objects)]
+            for recipe, pk in zip(objects, reversed(list(ids))):
+                recipe.pk = pk
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=recipe['recipe'].pk, tag_id=tag_id)
+            for recipe in recipes for tag_id in recipe['tags']
+        ])
+        IngredientsinRecipe.objects.bulk_create([
+            IngredientsinRecipe(
+                recipe_id=recipe['recipe'].pk,
+                ingredient_id=ingredient_id,
+                amount=amount
+            )
+            for recipe in recipes
+            for ingredient_id, amount in recipe['ingredients'].items()
+        ])
+        # bulk_create не отправляет сигналы, денормализации
+        # обновляются явно.
+        for author_id, count in Counter(
+            recipe.author_id for recipe in objects
+        ).items():
+            change_counter(User, author_id, 'recipes_count', count)
+        recipe_ids = [recipe.pk for recipe in objects]
+        add_recipes_to_feeds(recipe_ids)
+        update_search_index(recipe_ids)
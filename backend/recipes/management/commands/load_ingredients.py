@@ -1,25 +1,163 @@
+import csv
 import json
+from collections import Counter
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
 
+from api_foodgram.versions import bump_versions
+from backend.constants import MAX_LENGTH_INGREDIENT
 from recipes.models import Ingredient
 
+READ_SIZE = 64 * 1024
+CSV_HEADER = ['name', 'measurement_unit']
+SEPARATORS = ' \t\r\n,'
+# Ограничение на число параметров одного запроса в SQLite.
+INSERT_CHUNK_SIZE = 400
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row == CSV_HEADER or not row:
+            continue
+        yield row[0], row[1] if len(row) > 1 else ''
+
+
+def read_json(file):
+    """
+    Элементы JSON-массива по одному: файл читается частями по READ_SIZE,
+    в памяти держится только необработанный остаток.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, started = '', 0, False
+    while True:
+        while position < len(buffer) and buffer[position] in SEPARATORS:
+            position += 1
+        try:
+            if position == len(buffer):
+                raise ValueError
+            if not started:
+                if buffer[position] != '[':
+                    raise CommandError('Ожидался JSON-массив ингредиентов')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            item, position = decoder.raw_decode(buffer, position)
+        except ValueError:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise CommandError(
+                    'Некорректный или незавершенный JSON-массив'
+                )
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        if not isinstance(item, dict):
+            raise CommandError('Ингредиент должен быть JSON-объектом')
+        yield item.get('name', ''), item.get('measurement_unit', '')
+
+
+READERS = {'.csv': read_csv, '.json': read_json}
+
 
 class Command(BaseCommand):
     help = (
-        'Удаляет все ингредиенты и создает '
-        'ингредиенты в БД из JSON документа'
+        'Добавляет в БД ингредиенты из CSV или JSON файла, которых там еще '
+        'нет. Существующие ингредиенты не изменяются и не удаляются'
     )
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='data/ingredients.json',
+            help='Файл .csv (название, единица) или .json (массив объектов)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество ингредиентов, обрабатываемых за раз'
+        )
+
     def handle(self, *args, **options):
-        with open('data/ingredients.json', encoding='utf-8') as file:
-            ingredients_list = json.load(file)
-            Ingredient.objects.all().delete()
-            Ingredient.objects.bulk_create(
-                Ingredient(
-                    name=ingredient['name'],
-                    measurement_unit=ingredient['measurement_unit']
+        path = Path(options['path'])
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError('Поддерживаются файлы .csv и .json')
+        inserted = unchanged = skipped = 0
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = reader(file)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                keys = self.clean(batch)
+                skipped += len(batch) - sum(keys.values())
+                added = self.save(keys)
+                inserted += added
+                unchanged += sum(keys.values()) - added
+                self.stdout.write(
+                    f'Обработано: {inserted + unchanged + skipped}'
+                )
+        if inserted:
+            bump_versions('ingredients', 'recipes')
+        self.stdout.write(
+            f'Добавлено: {inserted}, без изменений: {unchanged}, '
+            f'пропущено: {skipped}'
+        )
+
+    @staticmethod
+    def clean(batch):
+        """
+        Нормализованные пары (название, единица) с числом их повторов
+        в пачке; пустые и слишком длинные значения отбрасываются.
+        """
+        keys = Counter()
+        for name, measurement_unit in batch:
+            key = (str(name).strip(), str(measurement_unit).strip())
+            if all(key) and max(map(len, key)) <= MAX_LENGTH_INGREDIENT:
+                keys[key] += 1
+        return keys
+
+    @staticmethod
+    def get_existing(keys):
+        return set(
+            Ingredient.objects.filter(
+                name__in={name for name, _ in keys}
+            ).values_list('name', 'measurement_unit')
+        )
+
+    @classmethod
+    def save(cls, keys):
+        """Создает недостающие ингредиенты и возвращает их количество."""
+        existing = cls.get_existing(keys)
+        return cls.insert([key for key in keys if key not in existing])
+
+    @staticmethod
+    def insert(keys):
+        """
+        INSERT ... ON CONFLICT DO NOTHING вместо
+        bulk_create(ignore_conflicts=True): rowcount не учитывает строки,
+        которые успел вставить другой процесс.
+        """
+        table = Ingredient._meta.db_table
+        columns = ', '.join(
+            Ingredient._meta.get_field(name).column
+            for name in ('name', 'measurement_unit')
+        )
+        inserted = 0
+        with connection.cursor() as cursor:
+            for start in range(0, len(keys), INSERT_CHUNK_SIZE):
+                chunk = keys[start:start + INSERT_CHUNK_SIZE]
+                cursor.execute(
+                    f'INSERT INTO {table} ({columns}) '
+                    f'VALUES {", ".join(["(%s, %s)"] * len(chunk))} '
+                    f'ON CONFLICT DO NOTHING',
+                    [value for key in chunk for value in key]
                 )
-                for ingredient in ingredients_list
-            )
-        self.stdout.write('Записи созданы')
+                inserted += cursor.rowcount
+        return inserted
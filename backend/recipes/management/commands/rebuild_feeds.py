@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.feed import get_expected_feeds, get_stored_feeds
+from recipes.models import FeedItem
+from recipes.reconcile import reconcile
+
+
+def create_feed_item(key, value):
+    (user_id, recipe_id), (author_id, pub_date) = key, value
+    return FeedItem(
+        user_id=user_id,
+        recipe_id=recipe_id,
+        author_id=author_id,
+        pub_date=pub_date
+    )
+
+
+class Command(BaseCommand):
+    help = 'Сверяет ленты пользователей с подписками и исправляет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить, завершиться с ошибкой при расхождениях'
+        )
+        parser.add_argument(
+            '--users-per-batch',
+            type=int,
+            default=500,
+            help='Количество пользователей, сверяемых за раз'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк, записываемых за один запрос'
+        )
+
+    def handle(self, *args, **options):
+        totals = reconcile(
+            FeedItem, 'recipe_id', get_expected_feeds, get_stored_feeds,
+            create_feed_item,
+            check=options['check'],
+            users_per_batch=options['users_per_batch'],
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(
+            f'Строк в лентах: {totals["stored"]}, '
+            f'ожидается: {totals["expected"]}. '
+            f'Отсутствует: {totals["missing"]}, лишних: {totals["extra"]}, '
+            f'с неверными полями: {totals["wrong"]}'
+        )
+        if not (totals['missing'] or totals['extra'] or totals['wrong']):
+            self.stdout.write('Ленты согласованы')
+        elif options['check']:
+            raise CommandError('Ленты расходятся с подписками')
+        else:
+            self.stdout.write('Ленты исправлены')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Recipe
+from recipes.search import update_search_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество рецептов, индексируемых за один запрос'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        recipe_ids = list(
+            Recipe.objects.order_by('id').values_list('id', flat=True)
+        )
+        with transaction.atomic():
+            for start in range(0, len(recipe_ids), batch_size):
+                update_search_index(recipe_ids[start:start + batch_size])
+                self.stdout.write(
+                    f'Проиндексировано рецептов: '
+                    f'{min(start + batch_size, len(recipe_ids))} '
+                    f'из {len(recipe_ids)}'
+                )
+        self.stdout.write('Индекс перестроен')
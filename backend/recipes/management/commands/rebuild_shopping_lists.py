@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingListItem
+from recipes.reconcile import reconcile
+from recipes.shopping_list import (get_expected_shopping_lists,
+                                   get_stored_shopping_lists)
+
+
+def create_shopping_list_item(key, amount):
+    user_id, ingredient_id = key
+    return ShoppingListItem(
+        user_id=user_id, ingredient_id=ingredient_id, amount=amount
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет списки покупок с корзинами пользователей '
+        'и исправляет расхождения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить, завершиться с ошибкой при расхождениях'
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='id пользователя, можно указать несколько раз'
+        )
+        parser.add_argument(
+            '--users-per-batch',
+            type=int,
+            default=500,
+            help='Количество пользователей, сверяемых за раз'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк, записываемых за один запрос'
+        )
+
+    def handle(self, *args, **options):
+        totals = reconcile(
+            ShoppingListItem, 'ingredient_id', get_expected_shopping_lists,
+            get_stored_shopping_lists, create_shopping_list_item,
+            user_ids=options['users'],
+            check=options['check'],
+            users_per_batch=options['users_per_batch'],
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(
+            f'Строк в списках: {totals["stored"]}, '
+            f'ожидается: {totals["expected"]}. '
+            f'Отсутствует: {totals["missing"]}, лишних: {totals["extra"]}, '
+            f'с неверным количеством: {totals["wrong"]}'
+        )
+        if not (totals['missing'] or totals['extra'] or totals['wrong']):
+            self.stdout.write('Списки покупок согласованы')
+        elif options['check']:
+            raise CommandError('Списки покупок расходятся с корзинами')
+        else:
+            self.stdout.write('Списки покупок исправлены')
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api_foodgram.versions import bump_versions
+from recipes.popularity import rollup_counters, update_trending_scores
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счетчики избранного, корзин, подписчиков и рецептов '
+        'с таблицами связей и пересчитывает оценку для трендов. '
+        'Рассчитана на периодический запуск, например раз в 10 минут'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить счетчики, завершиться с ошибкой '
+                 'при расхождениях'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество оценок, записываемых за один запрос'
+        )
+
+    def handle(self, *args, **options):
+        drift = rollup_counters(check=options['check'])
+        for counter, count in drift.items():
+            self.stdout.write(f'{counter}: неверных значений {count}')
+        if options['check']:
+            if any(drift.values()):
+                raise CommandError('Счетчики расходятся со связями')
+            self.stdout.write('Счетчики согласованы')
+            return
+        changed = update_trending_scores(options['batch_size'])
+        if changed or any(drift.values()):
+            bump_versions('popularity')
+        self.stdout.write(f'Оценка для трендов обновлена у {changed} рецептов')
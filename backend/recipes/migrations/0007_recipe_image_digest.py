@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_digest',
+            field=models.CharField(blank=True, editable=False, help_text='Заполняется, когда готовы уменьшенные копии изображения', max_length=64, verbose_name='Хеш изображения'),
+        ),
+    ]
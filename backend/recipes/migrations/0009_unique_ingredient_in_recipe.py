@@ -0,0 +1,44 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:53
+
+from django.db import migrations, models
+
+MAX_AMOUNT = 32767
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """
+    Схлопывает повторы ингредиента в рецепте в одну строку с суммарным
+    количеством - так же их уже учитывает список покупок.
+    """
+    IngredientsinRecipe = apps.get_model('recipes', 'IngredientsinRecipe')
+    duplicates = IngredientsinRecipe.objects.values(
+        'recipe_id', 'ingredient_id'
+    ).annotate(
+        count=models.Count('id'),
+        total=models.Sum('amount'),
+        first_id=models.Min('id')
+    ).filter(count__gt=1).order_by()
+    for duplicate in list(duplicates):
+        rows = IngredientsinRecipe.objects.filter(
+            recipe_id=duplicate['recipe_id'],
+            ingredient_id=duplicate['ingredient_id']
+        )
+        rows.exclude(id=duplicate['first_id']).delete()
+        rows.update(amount=min(duplicate['total'], MAX_AMOUNT))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredientsinrecipe',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_ingredient_in_recipe'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:57
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+# Модель связи: (поле связи, модель со счетчиком, счетчик).
+COUNTERS = (
+    (('recipes', 'Favorite'), 'recipe', ('recipes', 'Recipe'),
+     'favorites_count'),
+    (('recipes', 'ShoppingCart'), 'recipe', ('recipes', 'Recipe'),
+     'carts_count'),
+    (('users', 'Subscription'), 'author', ('users', 'User'),
+     'followers_count'),
+    (('recipes', 'Recipe'), 'author', ('users', 'User'), 'recipes_count'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for sender, field, model, counter in COUNTERS:
+        sender = apps.get_model(*sender)
+        actual = Coalesce(
+            models.Subquery(
+                sender.objects.filter(
+                    **{field: models.OuterRef('pk')}
+                ).order_by().values(
+                    field
+                ).annotate(
+                    count=models.Count('pk')
+                ).values('count')
+            ),
+            0
+        )
+        apps.get_model(*model).objects.update(**{counter: actual})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_feeditem'),
+        ('users', '0003_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в корзину'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, help_text='Пересчитывается командой rollup_counters', verbose_name='Оценка популярности'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-pub_date', '-id'], name='recipe_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending_score', '-id'], name='recipe_trending_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
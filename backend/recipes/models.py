@@ -3,13 +3,16 @@ from django.core.validators import MinValueValidator
 from django.db import models
 
 from backend.constants import MAX_LENGTH_RECIPE
+from backend.counters import CounterFieldsMixin
 from ingredients.models import Ingredient
 from tags.models import Tag
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
-class Recipe(models.Model):
+class Recipe(CounterFieldsMixin, models.Model):
     tags = models.ManyToManyField(
         Tag,
         verbose_name='Теги',
@@ -33,7 +36,15 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         'Изображение',
-        upload_to='recipes/images'
+        upload_to='recipes/images',
+        storage=ContentAddressedStorage()
+    )
+    image_digest = models.CharField(
+        'Хеш изображения',
+        max_length=64,
+        blank=True,
+        editable=False,
+        help_text='Заполняется, когда готовы уменьшенные копии изображения'
     )
     text = models.TextField(
         'Описание'
@@ -51,11 +62,43 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True,
     )
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное',
+        default=0,
+        editable=False
+    )
+    carts_count = models.PositiveIntegerField(
+        'Добавлений в корзину',
+        default=0,
+        editable=False
+    )
+    trending_score = models.FloatField(
+        'Оценка популярности',
+        default=0,
+        editable=False,
+        help_text='Пересчитывается командой rollup_counters'
+    )
+
+    counter_fields = ('favorites_count', 'carts_count', 'trending_score')
 
     class Meta:
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ('-pub_date', )
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date', '-id'],
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=['-trending_score', '-id'],
+                name='recipe_trending_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -87,6 +130,12 @@ class IngredientsinRecipe(models.Model):
     class Meta:
         verbose_name = 'количество ингредиентов в рецепте'
         verbose_name_plural = 'Количество ингредиентов в рецепте'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'ingredient'],
+                name='unique_ingredient_in_recipe'
+            )
+        ]
 
 
 class Favorite(models.Model):
@@ -137,3 +186,87 @@ class ShoppingCart(models.Model):
                 name='unique_recipe_in_card'
             )
         ]
+
+
+class ShoppingListItem(models.Model):
+    """
+    Суммарное количество ингредиента во всех рецептах корзины пользователя.
+
+    Денормализация ShoppingCart и IngredientsinRecipe, поддерживается
+    функциями recipes.shopping_list.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='shopping_list'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+        related_name='shopping_list_items'
+    )
+    amount = models.PositiveIntegerField(
+        'Количество'
+    )
+
+    class Meta:
+        verbose_name = 'ингредиент в списке покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_ingredient_in_shopping_list'
+            )
+        ]
+
+
+class FeedItem(models.Model):
+    """
+    Рецепт в ленте пользователя - от автора, на которого он подписан.
+
+    Денормализация Subscription и Recipe, поддерживается функциями
+    recipes.feed. author и pub_date скопированы из рецепта, чтобы лента
+    читалась одним проходом по индексу, а отписка удаляла строки
+    без соединения с рецептами.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='feed'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='feed_items'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Автор рецепта',
+        related_name='+'
+    )
+    pub_date = models.DateTimeField(
+        'Дата публикации'
+    )
+
+    class Meta:
+        verbose_name = 'рецепт в ленте'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_recipe_in_feed'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_user_pub_date_idx'
+            )
+        ]
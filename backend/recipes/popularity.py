@@ -0,0 +1,117 @@
+"""
+Счетчики популярности рецептов и авторов и оценка для трендов.
+
+Счетчики меняются одним UPDATE ... SET n = n + 1 в транзакции, которая
+создает или удаляет связь, поэтому параллельные запросы не теряют
+изменений и не читают счетчик перед записью. Команда rollup_counters
+сверяет счетчики с таблицами связей и пересчитывает trending_score.
+"""
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from users.models import Subscription
+
+from .models import Favorite, Recipe, ShoppingCart
+
+User = get_user_model()
+
+POPULAR_ORDERING = ('-favorites_count', '-pub_date', '-id')
+TRENDING_ORDERING = ('-trending_score', '-id')
+TRENDING_WINDOW = timedelta(days=7)
+# Оценка (избранное + CART_WEIGHT * корзины) / (возраст в часах + 2)
+# ** TRENDING_GRAVITY: чем старше рецепт, тем больше добавлений нужно,
+# чтобы удержаться в трендах.
+TRENDING_GRAVITY = 1.5
+CART_WEIGHT = 0.5
+
+# Модель связи: (поле связи, модель со счетчиком, счетчик).
+COUNTERS = {
+    Favorite: ('recipe', Recipe, 'favorites_count'),
+    ShoppingCart: ('recipe', Recipe, 'carts_count'),
+    Subscription: ('author', User, 'followers_count'),
+    Recipe: ('author', User, 'recipes_count'),
+}
+
+
+def change_counter(model, pk, counter, delta):
+    objects = model.objects.filter(pk=pk)
+    if delta < 0:
+        objects = objects.filter(**{f'{counter}__gte': -delta})
+    objects.update(**{counter: F(counter) + delta})
+
+
+def change_relation_counter(sender, instance, delta):
+    field, model, counter = COUNTERS[sender]
+    change_counter(
+        model,
+        getattr(instance, sender._meta.get_field(field).attname),
+        counter,
+        delta
+    )
+
+
+def get_actual_count(sender, field):
+    return Coalesce(
+        Subquery(
+            sender.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(
+                field
+            ).annotate(
+                count=Count('pk')
+            ).values('count')
+        ),
+        0
+    )
+
+
+def rollup_counters(check=False):
+    """
+    Исправляет разошедшиеся счетчики одним UPDATE на счетчик.
+    Возвращает количество неверных значений по именам счетчиков.
+    """
+    drift = {}
+    for sender, (field, model, counter) in COUNTERS.items():
+        actual = get_actual_count(sender, field)
+        wrong = model.objects.exclude(**{counter: actual})
+        drift[f'{model._meta.model_name}.{counter}'] = (
+            wrong.count() if check else wrong.update(**{counter: actual})
+        )
+    return drift
+
+
+def get_trending_score(recipe, now):
+    hours = (now - recipe.pub_date).total_seconds() / 3600
+    return (
+        (recipe.favorites_count + CART_WEIGHT * recipe.carts_count)
+        / (max(hours, 0) + 2) ** TRENDING_GRAVITY
+    )
+
+
+def update_trending_scores(batch_size=1000):
+    """
+    Пересчитывает оценку рецептов за TRENDING_WINDOW и обнуляет ее
+    у вышедших из окна. Возвращает количество измененных рецептов.
+    """
+    now = timezone.now()
+    since = now - TRENDING_WINDOW
+    expired = Recipe.objects.filter(
+        pub_date__lt=since, trending_score__gt=0
+    ).update(trending_score=0)
+    changed = []
+    for recipe in Recipe.objects.filter(pub_date__gte=since).only(
+        'id', 'pub_date', 'favorites_count', 'carts_count', 'trending_score'
+    ).iterator():
+        score = get_trending_score(recipe, now)
+        if score != recipe.trending_score:
+            recipe.trending_score = score
+            changed.append(recipe)
+    Recipe.objects.bulk_update(
+        changed, ['trending_score'], batch_size=batch_size
+    )
+    return expired + len(changed)
@@ -0,0 +1,79 @@
+"""
+Сверка таблиц, которые заполняются при записи (ленты, списки покупок),
+с данными, по которым они строятся.
+
+Строки читаются через iterator() порциями пользователей, поэтому в памяти
+одновременно держатся строки только одной порции, а каждая порция
+исправляется в своей транзакции.
+"""
+
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+User = get_user_model()
+
+
+def get_user_batches(user_ids, size):
+    users = User.objects.order_by('id').values_list('id', flat=True)
+    if user_ids is not None:
+        users = users.filter(id__in=user_ids)
+    batch = []
+    for user_id in users.iterator():
+        batch.append(user_id)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def reconcile(model, field, get_expected, get_stored, create, user_ids=None,
+              check=False, users_per_batch=500, batch_size=1000):
+    """
+    Сверяет строки model с ожидаемыми и, если не check, исправляет их.
+
+    get_expected и get_stored по списку id пользователей возвращают
+    словари {(user_id, значение field): остальные поля}, create строит
+    объект model по ключу и значению. Возвращает счетчики строк:
+    stored, expected, missing, extra и wrong.
+    """
+    totals = Counter()
+    for batch in get_user_batches(user_ids, users_per_batch):
+        with transaction.atomic():
+            expected = get_expected(batch)
+            stored = get_stored(batch)
+            missing = expected.keys() - stored.keys()
+            extra = stored.keys() - expected.keys()
+            wrong = {
+                key for key in expected.keys() & stored.keys()
+                if expected[key] != stored[key]
+            }
+            totals.update(
+                stored=len(stored), expected=len(expected),
+                missing=len(missing), extra=len(extra), wrong=len(wrong)
+            )
+            if not check:
+                repair(model, field, expected, missing, extra | wrong,
+                       create, batch_size)
+    return totals
+
+
+def repair(model, field, expected, missing, stale, create, batch_size):
+    stale = sorted(stale)
+    for start in range(0, len(stale), batch_size):
+        groups = {}
+        for user_id, value in stale[start:start + batch_size]:
+            groups.setdefault(user_id, []).append(value)
+        for user_id, values in groups.items():
+            model.objects.filter(
+                user_id=user_id, **{f'{field}__in': values}
+            ).delete()
+    model.objects.bulk_create(
+        [
+            create(key, expected[key])
+            for key in sorted(missing | (set(stale) & expected.keys()))
+        ],
+        batch_size=batch_size
+    )
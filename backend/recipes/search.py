@@ -0,0 +1,153 @@
+"""
+Полнотекстовый поиск рецептов по названию, описанию и ингредиентам.
+
+Документы хранятся в таблице recipes_recipe_search, которую создает
+миграция: в PostgreSQL это tsvector с GIN-индексом и русской морфологией,
+в SQLite - виртуальная таблица FTS5 со стеммингом на стороне Python.
+"""
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from ingredients.models import Ingredient
+
+from .models import IngredientsinRecipe, Recipe
+from .stemmer import stem_text
+
+SEARCH_TABLE = 'recipes_recipe_search'
+
+
+def update_search_index(recipe_ids=None):
+    """
+    Пересчитывает документы рецептов из recipe_ids, без аргумента - всех.
+    """
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+    if connection.vendor == 'postgresql':
+        update_postgresql_index(recipe_ids)
+    elif connection.vendor == 'sqlite':
+        update_sqlite_index(recipe_ids)
+
+
+def delete_from_search_index(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids or connection.vendor not in ('postgresql', 'sqlite'):
+        return
+    column = 'recipe_id' if connection.vendor == 'postgresql' else 'rowid'
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE {column} IN ({placeholders})',
+            recipe_ids
+        )
+
+
+def update_postgresql_index(recipe_ids):
+    where = '' if recipe_ids is None else 'WHERE r.id = ANY(%s)'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            INSERT INTO {SEARCH_TABLE} (recipe_id, document)
+            SELECT
+                r.id,
+                setweight(to_tsvector('russian', r.name), 'A')
+                || setweight(to_tsvector(
+                    'russian', coalesce(string_agg(i.name, ' '), '')
+                ), 'B')
+                || setweight(to_tsvector('russian', r.text), 'C')
+            FROM {Recipe._meta.db_table} r
+            LEFT JOIN {IngredientsinRecipe._meta.db_table} ir
+                ON ir.recipe_id = r.id
+            LEFT JOIN {Ingredient._meta.db_table} i
+                ON i.id = ir.ingredient_id
+            {where}
+            GROUP BY r.id
+            ON CONFLICT (recipe_id)
+                DO UPDATE SET document = EXCLUDED.document
+            ''',
+            [] if recipe_ids is None else [list(recipe_ids)]
+        )
+
+
+def update_sqlite_index(recipe_ids):
+    recipes = Recipe.objects.order_by()
+    links = IngredientsinRecipe.objects.order_by()
+    if recipe_ids is not None:
+        recipes = recipes.filter(id__in=recipe_ids)
+        links = links.filter(recipe_id__in=recipe_ids)
+    ingredients = {}
+    for recipe_id, name in links.values_list('recipe_id', 'ingredient__name'):
+        ingredients.setdefault(recipe_id, []).append(name)
+    rows = [
+        (
+            recipe_id,
+            stem_text(name),
+            stem_text(' '.join(ingredients.get(recipe_id, ()))),
+            stem_text(text),
+        )
+        for recipe_id, name, text in recipes.values_list('id', 'name', 'text')
+    ]
+    with connection.cursor() as cursor:
+        if recipe_ids is None:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        else:
+            delete_from_search_index(recipe_ids)
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, name, ingredients, text) '
+            f'VALUES (%s, %s, %s, %s)',
+            rows
+        )
+
+
+def search_recipes(queryset, query):
+    """
+    Оставляет в queryset рецепты, подходящие под query, и сортирует их
+    по релевантности: совпадения в названии весят больше, чем
+    в ингредиентах, а те - больше, чем в описании.
+    """
+    if connection.vendor == 'postgresql':
+        condition = (
+            f'SELECT recipe_id FROM {SEARCH_TABLE} '
+            f"WHERE document @@ websearch_to_tsquery('russian', %s)"
+        )
+        rank = (
+            f'SELECT ts_rank(document, '
+            f"websearch_to_tsquery('russian', %s)) "
+            f'FROM {SEARCH_TABLE} '
+            f'WHERE recipe_id = {Recipe._meta.db_table}.id'
+        )
+        params = (query, )
+        descending = True
+    elif connection.vendor == 'sqlite':
+        terms = stem_text(query).split()
+        if not terms:
+            return queryset
+        match = ' '.join(f'"{term}"' for term in terms)
+        condition = (
+            f'SELECT rowid FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s'
+        )
+        rank = (
+            f'SELECT bm25({SEARCH_TABLE}, 10.0, 5.0, 1.0) '
+            f'FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s '
+            f'AND rowid = {Recipe._meta.db_table}.id'
+        )
+        params = (match, )
+        descending = False
+    else:
+        return queryset.filter(
+            Q(name__icontains=query)
+            | Q(text__icontains=query)
+            | Q(ingredients__name__icontains=query)
+        ).distinct()
+    return queryset.filter(
+        id__in=RawSQL(condition, params)
+    ).annotate(
+        search_rank=RawSQL(rank, params)
+    ).order_by(
+        '-search_rank' if descending else 'search_rank', '-pub_date', '-id'
+    )
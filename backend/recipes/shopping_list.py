@@ -0,0 +1,167 @@
+"""
+Поддержка таблицы ShoppingListItem - суммарного количества каждого
+ингредиента в корзине пользователя.
+
+Каждое изменение корзины или состава рецепта применяется к таблице
+одним-двумя запросами без пересчета всей корзины: добавление - вставка
+с ON CONFLICT, удаление - вычитание с последующим удалением нулевых
+строк. Синтаксис поддерживают PostgreSQL и SQLite.
+"""
+
+from django.db import connection
+from django.db.models import Sum
+
+from .models import IngredientsinRecipe, ShoppingCart, ShoppingListItem
+
+ITEMS = ShoppingListItem._meta.db_table
+LINKS = IngredientsinRecipe._meta.db_table
+CART = ShoppingCart._meta.db_table
+
+
+def delete_empty_items(cursor, condition, params):
+    cursor.execute(
+        f'DELETE FROM {ITEMS} WHERE amount <= 0 AND {condition}', params
+    )
+
+
+def add_recipe_to_shopping_list(user_id, recipe_id):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            INSERT INTO {ITEMS} (user_id, ingredient_id, amount)
+            SELECT %s, ingredient_id, SUM(amount)
+            FROM {LINKS}
+            WHERE recipe_id = %s
+            GROUP BY ingredient_id
+            ON CONFLICT (user_id, ingredient_id)
+                DO UPDATE SET amount = {ITEMS}.amount + EXCLUDED.amount
+            ''',
+            [user_id, recipe_id]
+        )
+
+
+def fill_shopping_lists(user_ids):
+    """
+    Заново собирает списки покупок пользователей из user_ids по их
+    корзинам одним INSERT ... SELECT.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {ITEMS} WHERE user_id IN ({placeholders})',
+            user_ids
+        )
+        cursor.execute(
+            f'''
+            INSERT INTO {ITEMS} (user_id, ingredient_id, amount)
+            SELECT cart.user_id, link.ingredient_id, SUM(link.amount)
+            FROM {CART} cart
+            JOIN {LINKS} link ON link.recipe_id = cart.recipe_id
+            WHERE cart.user_id IN ({placeholders})
+            GROUP BY cart.user_id, link.ingredient_id
+            ''',
+            user_ids
+        )
+
+
+def remove_recipe_from_shopping_list(user_id, recipe_id):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            UPDATE {ITEMS} SET amount = amount - (
+                SELECT SUM(amount) FROM {LINKS}
+                WHERE recipe_id = %s
+                    AND ingredient_id = {ITEMS}.ingredient_id
+            )
+            WHERE user_id = %s AND ingredient_id IN (
+                SELECT ingredient_id FROM {LINKS} WHERE recipe_id = %s
+            )
+            ''',
+            [recipe_id, user_id, recipe_id]
+        )
+        delete_empty_items(cursor, 'user_id = %s', [user_id])
+
+
+def get_recipe_amounts(recipe_id):
+    return dict(
+        IngredientsinRecipe.objects.filter(
+            recipe_id=recipe_id
+        ).values_list(
+            'ingredient_id'
+        ).annotate(
+            Sum('amount')
+        ).order_by()
+    )
+
+
+def change_recipe_in_shopping_lists(recipe_id, old_amounts, new_amounts):
+    """
+    Переносит изменение состава рецепта в списки покупок всех
+    пользователей, у которых он в корзине. old_amounts и new_amounts -
+    словари {id ингредиента: количество} до и после изменения.
+    """
+    changes = [
+        (ingredient_id, delta)
+        for ingredient_id, delta in (
+            (
+                ingredient_id,
+                new_amounts.get(ingredient_id, 0)
+                - old_amounts.get(ingredient_id, 0)
+            )
+            for ingredient_id in old_amounts.keys() | new_amounts.keys()
+        )
+        if delta
+    ]
+    if not changes:
+        return
+    users = f'SELECT user_id FROM {CART} WHERE recipe_id = %s'
+    with connection.cursor() as cursor:
+        for ingredient_id, delta in changes:
+            if delta > 0:
+                cursor.execute(
+                    f'''
+                    INSERT INTO {ITEMS} (user_id, ingredient_id, amount)
+                    SELECT user_id, %s, %s FROM {CART} WHERE recipe_id = %s
+                    ON CONFLICT (user_id, ingredient_id) DO UPDATE
+                        SET amount = {ITEMS}.amount + EXCLUDED.amount
+                    ''',
+                    [ingredient_id, delta, recipe_id]
+                )
+            else:
+                cursor.execute(
+                    f'UPDATE {ITEMS} SET amount = amount + %s '
+                    f'WHERE ingredient_id = %s AND user_id IN ({users})',
+                    [delta, ingredient_id, recipe_id]
+                )
+        delete_empty_items(cursor, f'user_id IN ({users})', [recipe_id])
+
+
+def get_expected_shopping_lists(user_ids=None):
+    """Списки покупок, посчитанные заново по корзинам."""
+    links = IngredientsinRecipe.objects.all()
+    if user_ids is not None:
+        links = links.filter(recipe__shopping_recipes__user_id__in=user_ids)
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in links.values_list(
+            'recipe__shopping_recipes__user_id', 'ingredient_id'
+        ).annotate(
+            Sum('amount')
+        ).order_by().iterator()
+        if user_id is not None
+    }
+
+
+def get_stored_shopping_lists(user_ids=None):
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in items.values_list(
+            'user_id', 'ingredient_id', 'amount'
+        ).iterator()
+    }
@@ -0,0 +1,97 @@
+from threading import local
+
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from ingredients.models import Ingredient
+from users.models import Subscription
+
+from .feed import add_author_to_feed, remove_author_from_feed
+from .models import Favorite, Recipe, ShoppingCart
+from .popularity import change_relation_counter
+from .search import delete_from_search_index, update_search_index
+from .shopping_list import (add_recipe_to_shopping_list,
+                            change_recipe_in_shopping_lists,
+                            get_recipe_amounts,
+                            remove_recipe_from_shopping_list)
+
+# Рецепты, которые удаляются в текущем потоке: их доля уже вычтена
+# из списков покупок, каскадное удаление из корзин не должно вычитать
+# ее повторно.
+deleting = local()
+
+
+def get_deleting_recipes():
+    if not hasattr(deleting, 'recipes'):
+        deleting.recipes = set()
+    return deleting.recipes
+
+
+@receiver(pre_delete, sender=Recipe)
+def release_recipe_from_shopping_lists(sender, instance, **kwargs):
+    change_recipe_in_shopping_lists(
+        instance.id, get_recipe_amounts(instance.id), {}
+    )
+    get_deleting_recipes().add(instance.id)
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_document(sender, instance, **kwargs):
+    get_deleting_recipes().discard(instance.id)
+    delete_from_search_index([instance.id])
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        add_recipe_to_shopping_list(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    if instance.recipe_id not in get_deleting_recipes():
+        remove_recipe_from_shopping_list(
+            instance.user_id, instance.recipe_id
+        )
+
+
+@receiver(post_save, sender=Subscription)
+def add_to_feed(sender, instance, created, **kwargs):
+    if created:
+        add_author_to_feed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def remove_from_feed(sender, instance, **kwargs):
+    remove_author_from_feed(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_save, sender=Recipe)
+def increment_counter(sender, instance, created, **kwargs):
+    if created:
+        change_relation_counter(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_delete, sender=Recipe)
+def decrement_counter(sender, instance, **kwargs):
+    # Счетчики удаляемого рецепта обновлять незачем.
+    if (
+        sender in (Favorite, ShoppingCart)
+        and instance.recipe_id in get_deleting_recipes()
+    ):
+        return
+    change_relation_counter(sender, instance, -1)
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes_documents(sender, instance, created, **kwargs):
+    if not created:
+        update_search_index(
+            list(instance.recipes.values_list('id', flat=True))
+        )
@@ -0,0 +1,128 @@
+"""
+Стеммер русского языка по алгоритму Snowball.
+
+Используется полнотекстовым поиском в SQLite, где нет встроенной
+русской морфологии. В PostgreSQL ту же работу делает конфигурация
+'russian' функции to_tsvector.
+"""
+
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ('ся', 'сь')
+VERB = (
+    (
+        'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+        'ет', 'ют', 'ны', 'ть', 'ешь', 'нно',
+    ),
+    (
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+        'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+        'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+    ),
+)
+NOUN = (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и',
+    'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о',
+    'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я',
+)
+DERIVATIONAL = ('ост', 'ость')
+SUPERLATIVE = ('ейш', 'ейше')
+
+
+def find_ending(word, start, endings, grouped=False):
+    """
+    Длина самого длинного окончания из endings, лежащего в word[start:].
+
+    Для сгруппированных окончаний первая группа допускается только после
+    'а' или 'я', которые остаются в слове.
+    """
+    groups = endings if grouped else ((), endings)
+    region = word[start:]
+    for length in range(len(region), 0, -1):
+        ending = region[-length:]
+        if ending in groups[1]:
+            return length
+        if ending in groups[0] and region[:-length][-1:] in ('а', 'я'):
+            return length
+    return 0
+
+
+def get_regions(word):
+    rv = r1 = r2 = len(word)
+    for index, letter in enumerate(word):
+        if letter in VOWELS:
+            rv = index + 1
+            break
+    for index in range(1, len(word)):
+        if word[index - 1] in VOWELS and word[index] not in VOWELS:
+            r1 = index + 1
+            break
+    for index in range(r1 + 1, len(word)):
+        if word[index - 1] in VOWELS and word[index] not in VOWELS:
+            r2 = index + 1
+            break
+    return rv, r1, r2
+
+
+def remove_adjectival(word, rv):
+    length = find_ending(word, rv, ADJECTIVE)
+    if not length:
+        return word, False
+    word = word[:-length]
+    participle = find_ending(word, rv, PARTICIPLE, grouped=True)
+    if participle:
+        word = word[:-participle]
+    return word, True
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv, _, r2 = get_regions(word)
+    length = find_ending(word, rv, PERFECTIVE_GERUND, grouped=True)
+    if length:
+        word = word[:-length]
+    else:
+        length = find_ending(word, rv, REFLEXIVE)
+        if length:
+            word = word[:-length]
+        word, removed = remove_adjectival(word, rv)
+        if not removed:
+            length = (
+                find_ending(word, rv, VERB, grouped=True)
+                or find_ending(word, rv, NOUN)
+            )
+            if length:
+                word = word[:-length]
+    if word[rv:].endswith('и'):
+        word = word[:-1]
+    length = find_ending(word, r2, DERIVATIONAL)
+    if length:
+        word = word[:-length]
+    if word[rv:].endswith('нн'):
+        return word[:-1]
+    length = find_ending(word, rv, SUPERLATIVE)
+    if length:
+        word = word[:-length]
+        return word[:-1] if word[rv:].endswith('нн') else word
+    if word[rv:].endswith('ь'):
+        word = word[:-1]
+    return word
+
+
+def stem_text(text):
+    return ' '.join(stem(word) for word in re.findall(r'\w+', text.lower()))
@@ -0,0 +1,47 @@
+import os
+from hashlib import sha256
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла - sha256 его содержимого.
+
+    Одинаковые файлы хранятся один раз: если файл с таким содержимым уже
+    есть, байты не записываются повторно и возвращается готовое имя.
+    Неиспользуемые файлы удаляет команда collect_images.
+    Уменьшенные копии изображений тоже хранятся здесь через save_once.
+    """
+
+    def get_content_name(self, name, content):
+        digest = sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        return self.save_once(
+            self.get_content_name(name, content), content, max_length
+        )
+
+    def save_once(self, name, content, max_length=None):
+        """
+        Сохраняет файл, если его еще нет. Имя должно однозначно
+        определяться содержимым: копия от параллельной записи удаляется.
+        """
+        if self.exists(name):
+            return name
+        saved = super().save(name, content, max_length)
+        if saved != name:
+            self.delete(saved)
+        return name
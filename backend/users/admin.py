@@ -2,6 +2,9 @@ from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin
 
+from backend.admin import (AuthorInputFilter, EstimatedCountPaginator,
+                           ScalableAdmin, UserInputFilter)
+
 from .models import Subscription
 
 User = get_user_model()
@@ -15,6 +18,8 @@ class UserAdmin(UserAdmin):
         'first_name',
         'last_name',
         'email',
+        'followers_count',
+        'recipes_count',
         'password'
     )
     search_fields = (
@@ -24,18 +29,23 @@ class UserAdmin(UserAdmin):
         'email'
     )
     list_filter = (
-        'username',
-        'email'
+        'is_staff',
+        'is_active'
     )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(ScalableAdmin):
     list_display = (
         'id',
         'user',
         'author'
     )
+    list_select_related = ('user', 'author')
     list_filter = (
-        'user',
+        UserInputFilter,
+        AuthorInputFilter
     )
+    autocomplete_fields = ('user', 'author')
@@ -4,16 +4,29 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 
 from backend.constants import MAX_LENGTH_USER
+from backend.counters import CounterFieldsMixin
 
 
-class User(AbstractUser):
+class User(CounterFieldsMixin, AbstractUser):
     email = models.EmailField(_('email address'), unique=True)
     first_name = models.CharField(_('first name'), max_length=MAX_LENGTH_USER)
     last_name = models.CharField(_('last name'), max_length=MAX_LENGTH_USER)
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков',
+        default=0,
+        editable=False
+    )
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов',
+        default=0,
+        editable=False
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
+    counter_fields = ('followers_count', 'recipes_count')
+
     class Meta:
         verbose_name = 'пользователь'
         verbose_name_plural = 'Пользователи'